@@ -0,0 +1,416 @@
+"""Synthetic data generator and route benchmarks.
+
+Point DATABASE_URL at a scratch database first, e.g.
+
+    export DATABASE_URL=sqlite:///bench.db
+    python bench.py seed --cases 100000 --hearings 1000000 --notifications 2000000
+    python bench.py run --out before.json
+    ... change code ...
+    python bench.py run --out after.json
+    python bench.py compare before.json after.json
+
+`run` drives the routes through the Flask test client and records latency
+percentiles, SQL statements per request and peak Python memory per
+scenario, written as JSON so runs from different commits can be compared.
+
+`startup` times a fresh process importing the app and serving its first
+request (with and without the Jinja bytecode cache), and boots gunicorn
+with and without preload_app to report per-worker RSS and PSS.
+"""
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from datetime import date, datetime, timedelta
+
+import click
+
+os.environ.setdefault('OUTBOX_WORKER', 'off')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+# The environment must be set before the app loads
+from app import app  # noqa: E402
+from law_office.extensions import db  # noqa: E402
+from law_office.migrations import init_db  # noqa: E402
+from law_office.models import Case, Hearing, Notification  # noqa: E402
+from law_office.queries import count_queries  # noqa: E402
+from law_office.search import rebuild_search_index  # noqa: E402
+from law_office.summaries import (  # noqa: E402
+    rebuild_fee_summary, rebuild_hearing_summary, rebuild_status_counts,
+)
+
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Meera',
+               'Rohan', 'Saanvi', 'Arjun', 'Priya', 'Rahul', 'Sneha', 'Vikram', 'Neha',
+               'Suresh', 'Lakshmi', 'Imran', 'Fatima', 'Joseph', 'Mary', 'Harpreet', 'Gurpreet']
+SURNAMES = ['Sharma', 'Patil', 'Deshmukh', 'Kulkarni', 'Iyer', 'Reddy', 'Khan', 'Singh',
+            'Gupta', 'Joshi', 'Nair', 'Mehta', 'Shaikh', 'Pawar', 'Jadhav', 'Fernandes',
+            'Chavan', 'Bose', 'Das', 'Menon']
+COURTS = ['District Court Pune', 'Sessions Court Pune', 'Civil Court Shivajinagar',
+          'High Court Bombay', 'Family Court Pune', 'JMFC Court Khadki', 'Consumer Forum Pune',
+          'Labour Court Pune', 'Small Causes Court Mumbai', 'District Court Thane']
+POLICE_STATIONS = ['Shivajinagar', 'Deccan', 'Kothrud', 'Hadapsar', 'Yerwada', 'Swargate',
+                   'Chatushrungi', 'Wakad', 'Hinjewadi', 'Vishrantwadi', None, None]
+CASE_TYPES = [('Criminal', 'CR'), ('Civil', 'CS'), ('Family', 'FC'), ('Bail', 'BA'),
+              ('Consumer', 'CC'), ('Labour', 'LC'), ('Writ', 'WP')]
+STATUSES = ['Filed'] * 3 + ['In Progress'] * 4 + ['Hearing'] * 5 + ['Judgment'] + ['Closed'] * 4
+STAGES = ['Appearance', 'Filing of written statement', 'Evidence', 'Cross examination',
+          'Arguments', 'Orders', 'Bail hearing', 'Framing of charges', 'Mediation']
+LAWYERS = ['Adv. R. Kulkarni', 'Adv. S. Deshpande', 'Adv. M. Khan', 'Adv. P. Iyer',
+           'Adv. A. Fernandes', 'Adv. K. Patil']
+
+
+def _name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}"
+
+
+def _insert_chunked(model, rows, chunk=10000):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk:
+            db.session.execute(db.insert(model), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(db.insert(model), batch)
+        db.session.commit()
+
+
+def seed_database(cases, hearings, notifications, seed=42):
+    """Append synthetic cases, hearings and notifications with bulk inserts."""
+    rng = random.Random(seed)
+    today = date.today()
+    first_id = (db.session.query(db.func.max(Case.id)).scalar() or 0) + 1
+
+    def case_rows():
+        for n in range(first_id, first_id + cases):
+            case_type, code = rng.choice(CASE_TYPES)
+            filed = today - timedelta(days=rng.randint(0, 3650))
+            total = float(rng.choice([0, 5000, 10000, 25000, 50000, 100000]))
+            paid = float(rng.randint(0, int(total) // 1000) * 1000) if total else 0.0
+            client = _name(rng)
+            yield dict(
+                case_number=f"{code}/{n}/{filed.year}", lawyer_name=rng.choice(LAWYERS),
+                client_name=client,
+                client_email=f"{client.lower().replace(' ', '.')}{n}@example.com",
+                client_mobile=f"9{rng.randint(100000000, 999999999)}",
+                client_address=f"{rng.randint(1, 500)}, {rng.choice(POLICE_STATIONS) or 'Camp'}, Pune",
+                opponent_name=_name(rng), court_name=rng.choice(COURTS), case_type=case_type,
+                police_station=rng.choice(POLICE_STATIONS), location='Pune', filing_date=filed,
+                status=rng.choice(STATUSES),
+                description=f"{case_type} matter: {rng.choice(STAGES).lower()} pending",
+                total_fees=total, fees_paid=paid, fees_pending=total - paid,
+                notify_client=rng.random() < 0.6,
+            )
+
+    def hearing_rows():
+        for _ in range(hearings):
+            held = today + timedelta(days=rng.randint(-1500, 120))
+            yield dict(
+                case_id=rng.randint(first_id, first_id + cases - 1), hearing_date=held,
+                stage=rng.choice(STAGES), notes=rng.choice(['Adjourned', 'Heard', 'Part heard', None]),
+                next_hearing_date=held + timedelta(days=rng.randint(7, 60)) if rng.random() < 0.8 else None,
+                updated_status=None,
+            )
+
+    def notification_rows():
+        for _ in range(notifications):
+            case_id = rng.randint(first_id, first_id + cases - 1)
+            yield dict(
+                case_id=case_id, email_to=f"client{case_id}@example.com",
+                subject=f"New Hearing Added – Case {case_id}",
+                body=f"Dear client,\n\nA new hearing has been scheduled for your case.\n"
+                     f"Stage: {rng.choice(STAGES)}\n\nRegards,\n{rng.choice(LAWYERS)}",
+                sent_at=datetime.utcnow() - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60)),
+                status='sent',
+            )
+
+    _insert_chunked(Case, case_rows())
+    _insert_chunked(Hearing, hearing_rows())
+    _insert_chunked(Notification, notification_rows())
+    # Bulk inserts bypass the flush hooks that maintain these
+    rebuild_search_index()
+    rebuild_status_counts()
+    rebuild_fee_summary()
+    rebuild_hearing_summary()
+
+
+def _scenarios(rng, iterations):
+    """(name, method, path factory, form data factory, iterations)."""
+    max_case = db.session.query(db.func.max(Case.id)).scalar() or 1
+    max_hearing = db.session.query(db.func.max(Hearing.id)).scalar() or 1
+    case_id = lambda: rng.randint(1, max_case)  # noqa: E731
+    today = date.today().isoformat()
+    few = max(1, iterations // 10)
+    return [
+        ('dashboard', 'GET', lambda: '/', None, iterations),
+        ('dashboard_status', 'GET', lambda: '/?status=Closed', None, iterations),
+        ('dashboard_search', 'GET', lambda: f'/?search={rng.choice(SURNAMES)}', None, iterations),
+        ('dashboard_search_prefix', 'GET',
+         lambda: f'/?search={rng.choice(FIRST_NAMES)[:3]}+{rng.choice(SURNAMES)[:2]}', None, iterations),
+        ('dashboard_unscheduled', 'GET', lambda: '/?attention=unscheduled', None, iterations),
+        ('dashboard_idle', 'GET', lambda: '/?attention=idle', None, iterations),
+        ('cases', 'GET', lambda: '/cases', None, iterations),
+        ('cases_deep_page', 'GET', lambda: f'/cases?after={rng.randint(1, max_case)}', None, iterations),
+        ('case_details', 'GET', lambda: f'/case/{case_id()}', None, iterations),
+        ('case_notifications', 'GET', lambda: f'/case/{case_id()}/notifications', None, iterations),
+        ('hearing_add', 'POST', lambda: f'/case/{case_id()}/hearing/add',
+         lambda: {'hearing_date': today, 'stage': 'Benchmark'}, iterations),
+        ('hearing_edit', 'POST', lambda: f'/hearing/{rng.randint(1, max_hearing)}/edit',
+         lambda: {'hearing_date': today, 'stage': 'Benchmark edit'}, iterations),
+        ('calendar_week', 'GET', lambda: '/calendar?view=week', None, iterations),
+        ('calendar_month_lawyer', 'GET',
+         lambda: f'/calendar?view=month&lawyer={rng.choice(LAWYERS)}', None, iterations),
+        ('calendar_feed', 'GET', lambda: f'/calendar.ics?lawyer={rng.choice(LAWYERS)}', None, iterations),
+        ('typeahead_client', 'GET',
+         lambda: f'/typeahead/client_name?q={rng.choice(FIRST_NAMES)[:rng.randint(1, 4)]}', None, iterations),
+        ('typeahead_court', 'GET', lambda: f'/typeahead/court_name?q={rng.choice("bcdhs")}', None, iterations),
+        ('reports_by_lawyer', 'GET', lambda: '/reports?group=lawyer', None, iterations),
+        ('reports_by_month_open', 'GET', lambda: '/reports?group=month&status=Open', None, iterations),
+        ('export_notifications_xlsx', 'GET',
+         lambda: f'/case/{case_id()}/notifications/export', None, iterations),
+        ('export_cases_xlsx', 'GET', lambda: '/export/cases.xlsx?status=Judgment', None, few),
+        ('export_hearings_csv', 'GET', lambda: '/export/hearings.csv?status=Judgment', None, few),
+    ]
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_benchmarks(iterations=50, only=None, trace_memory=True, seed=1):
+    rng = random.Random(seed)
+    client = app.test_client()
+    client.get('/')  # migrations, caches
+    results = {}
+    for name, method, path, data, runs in _scenarios(rng, iterations):
+        if only and name not in only:
+            continue
+        timings, queries, statuses = [], [], {}
+        peak = 0
+        for _ in range(runs):
+            url = path()
+            form = data() if data else None
+            if trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            with count_queries() as statements:
+                if method == 'GET':
+                    response = client.get(url)
+                else:
+                    response = client.post(url, data=form)
+                response.get_data()  # drain streamed bodies
+            timings.append((time.perf_counter() - start) * 1000)
+            if trace_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            queries.append(len(statements))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        timings.sort()
+        results[name] = {
+            'runs': runs,
+            'p50_ms': round(_percentile(timings, 50), 3),
+            'p90_ms': round(_percentile(timings, 90), 3),
+            'p99_ms': round(_percentile(timings, 99), 3),
+            'max_ms': round(timings[-1], 3),
+            'queries_max': max(queries),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'peak_mem_kb': round(peak / 1024, 1) if trace_memory else None,
+            'statuses': statuses,
+        }
+        click.echo(f"{name:28} p50 {results[name]['p50_ms']:9.2f} ms  p99 {results[name]['p99_ms']:9.2f} ms  "
+                   f"sql {results[name]['queries_max']:3}  peak {results[name]['peak_mem_kb']} KiB")
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/')
+done = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_request_ms': (done - imported) * 1000,
+                  'modules': len(sys.modules)}))
+"""
+
+
+def measure_startup(runs, jinja_cache_dir):
+    """Median import and first-request time of fresh interpreter processes."""
+    env = dict(os.environ, JINJA_CACHE_DIR=jinja_cache_dir)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', STARTUP_PROBE], cwd=HERE, env=env, text=True)
+        samples.append(json.loads(out.splitlines()[-1]))
+    return {key: round(statistics.median(s[key] for s in samples), 1) for key in samples[0]}
+
+
+def _proc_kb(pid, path, field):
+    try:
+        with open(f'/proc/{pid}/{path}') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure_gunicorn(preload, workers, warm_requests):
+    """Boot gunicorn, warm its workers and read their memory from /proc (Linux)."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0', WEB_CONCURRENCY=str(workers))
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-b', f'127.0.0.1:{port}', 'app:app'],
+                            cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = None
+        children = []
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline and (ready is None or len(children) < workers):
+            time.sleep(0.05)
+            if ready is None:
+                try:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=30).read()
+                    ready = time.perf_counter() - start
+                except OSError:
+                    continue
+            with open(f'/proc/{proc.pid}/task/{proc.pid}/children') as f:
+                children = [int(pid) for pid in f.read().split()]
+        all_ready = time.perf_counter() - start
+        for _ in range(warm_requests):
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=30).read()
+        rss = [_proc_kb(pid, 'status', 'VmRSS') for pid in children]
+        pss = [_proc_kb(pid, 'smaps_rollup', 'Pss') for pid in children]
+        return {
+            'first_response_ms': round(ready * 1000, 1) if ready is not None else None,
+            'all_workers_ms': round(all_ready * 1000, 1),
+            'workers': len(children),
+            'worker_rss_kb': round(statistics.mean(rss)) if rss and None not in rss else None,
+            'worker_pss_kb': round(statistics.mean(pss)) if pss and None not in pss else None,
+            'total_pss_kb': (sum(pss) + (_proc_kb(proc.pid, 'smaps_rollup', 'Pss') or 0))
+                            if pss and None not in pss else None,
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+@click.group()
+def cli():
+    """Seed synthetic data and benchmark the Flask routes."""
+
+
+@cli.command()
+@click.option('--cases', default=10000, show_default=True)
+@click.option('--hearings', default=100000, show_default=True)
+@click.option('--notifications', default=200000, show_default=True)
+@click.option('--seed', default=42, show_default=True, help='Random seed (same seed, same data).')
+def seed(cases, hearings, notifications, seed):
+    """Append realistic synthetic cases, hearings and notifications."""
+    with app.app_context():
+        init_db()
+        start = time.perf_counter()
+        seed_database(cases, hearings, notifications, seed)
+        click.echo(f"Seeded {cases} cases, {hearings} hearings, {notifications} notifications "
+                   f"in {time.perf_counter() - start:.1f}s")
+
+
+@cli.command()
+@click.option('--iterations', default=50, show_default=True, help='Requests per scenario.')
+@click.option('--only', multiple=True, help='Run only the named scenario(s).')
+@click.option('--no-memory', is_flag=True, help='Skip tracemalloc (it slows requests down).')
+@click.option('--out', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def run(iterations, only, no_memory, out):
+    """Benchmark the routes against the current database."""
+    with app.app_context():
+        init_db()
+        sizes = {m.__tablename__: db.session.query(db.func.count(m.id)).scalar()
+                 for m in (Case, Hearing, Notification)}
+        results = run_benchmarks(iterations, set(only), not no_memory)
+    report = {
+        'revision': _git_revision(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1],
+        'rows': sizes,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+    }
+    if out:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+        click.echo(f"Wrote {out}")
+
+
+@cli.command()
+@click.option('--runs', default=5, show_default=True, help='Fresh processes per import measurement.')
+@click.option('--workers', default=4, show_default=True, help='gunicorn workers to boot.')
+@click.option('--requests', 'warm_requests', default=20, show_default=True,
+              help='Dashboard requests sent before reading worker memory.')
+@click.option('--no-gunicorn', is_flag=True, help='Only time imports and first requests.')
+@click.option('--out', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def startup(runs, workers, warm_requests, no_gunicorn, out):
+    """Process startup time and memory per gunicorn worker."""
+    with app.app_context():
+        init_db()
+    results = {'startup_no_bytecode_cache': measure_startup(runs, '')}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        measure_startup(1, cache_dir)  # fill the cache
+        results['startup_bytecode_cache'] = measure_startup(runs, cache_dir)
+    for name, data in results.items():
+        click.echo(f"{name:28} import {data['import_ms']:8.1f} ms  first request {data['first_request_ms']:8.1f} ms  "
+                   f"modules {data['modules']:.0f}")
+    if not no_gunicorn:
+        for preload in (False, True):
+            name = 'gunicorn_preload' if preload else 'gunicorn'
+            data = results[name] = measure_gunicorn(preload, workers, warm_requests)
+            click.echo(f"{name:28} first response {data['first_response_ms']} ms  all workers {data['all_workers_ms']} ms  "
+                       f"worker RSS {data['worker_rss_kb']} KiB  PSS {data['worker_pss_kb']} KiB  "
+                       f"total PSS {data['total_pss_kb']} KiB")
+    if out:
+        report = {'revision': _git_revision(), 'python': platform.python_version(), 'results': results}
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+        click.echo(f"Wrote {out}")
+
+
+@cli.command()
+@click.argument('baseline', type=click.File())
+@click.argument('candidate', type=click.File())
+def compare(baseline, candidate):
+    """Show p50/p99 and query-count changes between two result files."""
+    before, after = json.load(baseline)['results'], json.load(candidate)['results']
+    for name in sorted(set(before) & set(after)):
+        b, a = before[name], after[name]
+        change = lambda key: (a[key] - b[key]) / b[key] * 100 if b[key] else 0.0  # noqa: E731
+        click.echo(f"{name:28} p50 {b['p50_ms']:9.2f} -> {a['p50_ms']:9.2f} ms ({change('p50_ms'):+6.1f}%)  "
+                   f"p99 {change('p99_ms'):+6.1f}%  sql {b['queries_max']} -> {a['queries_max']}")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,33 @@
+"""gunicorn settings, picked up automatically by `gunicorn app:app`.
+
+The app is created and warmed once in the master (migrations applied,
+templates compiled) and workers fork from it instead of each importing
+the law_office package themselves.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    if preload_app:
+        from app import app
+        from law_office import preload
+        preload(app)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import app
+        from law_office import after_fork
+        after_fork(app)
+
+
+def worker_exit(server, worker):
+    # Drop the worker's METRICS_DIR snapshot so /metrics stops summing it in
+    from law_office.instrumentation import remove_metrics_snapshot
+    app = getattr(worker, 'wsgi', None)  # unset when the worker failed to load the app
+    if app is not None:
+        remove_metrics_snapshot(app.config['METRICS_DIR'], worker.pid)
@@ -0,0 +1,68 @@
+"""Law Office Case Management System.
+
+create_app() builds the Flask app: configuration from the environment,
+the database, request metrics and the cases, hearings, notifications,
+settings and exports blueprints. The blueprint modules (and through them
+openpyxl, smtplib and ReportLab, which they import on first use) load
+only here, so the PDF pool processes that import law_office.pdfs stay
+small.
+"""
+import logging
+import os
+import time
+
+from flask import Flask
+
+from .extensions import db, log
+
+
+def create_app():
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        format='%(asctime)s %(levelname)s %(name)s %(message)s',
+    )
+    from . import cases, exports, hearings, instrumentation, notifications, settings
+    from .config import apply_sqlite_pragmas, configure
+    from .helpers import format_date
+    from .migrations import ensure_db
+
+    app = Flask(__name__)
+    configure(app)
+    db.init_app(app)
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+    app.add_template_filter(format_date, 'format_date')
+    instrumentation.init_app(app)
+    app.before_request(ensure_db)
+    for module in (cases, hearings, notifications, settings, exports):
+        app.register_blueprint(module.bp)
+    return app
+
+# -----------------------
+# gunicorn preload
+# -----------------------
+# With preload_app (gunicorn.conf.py) the master creates the app once,
+# runs preload() and forks warm workers that share its memory pages.
+# after_fork() then drops what each worker must own: database connections,
+# the fragment cache's SQLite handles, the PDF pool and inherited metrics.
+def preload(app):
+    """Apply migrations and compile every template before workers fork."""
+    from .migrations import ensure_db
+    start = time.perf_counter()
+    with app.app_context():
+        ensure_db()
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+        db.engine.dispose()
+    log.info("preloaded in %.0f ms", (time.perf_counter() - start) * 1000)
+
+
+def after_fork(app):
+    """Reset per-process state inherited from the gunicorn master."""
+    from .instrumentation import METRICS
+    with app.app_context():
+        db.engine.dispose(close=False)  # the parent's connections stay the parent's
+    for name in ('fragment_cache', 'pdf_pool', 'send_limiter'):
+        app.extensions.pop(name, None)
+    for metric in METRICS:
+        metric.series.clear()
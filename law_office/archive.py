@@ -0,0 +1,102 @@
+"""Old notifications moved into compressed per-case blobs."""
+import heapq
+import itertools
+import json
+import zlib
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from flask import current_app
+
+from .extensions import db
+from .models import EmailOutbox, HearingReminder, Notification, NotificationArchive
+
+# -----------------------
+# Notification history
+# -----------------------
+# Final notifications older than NOTIFICATION_RETENTION_DAYS move to
+# notification_archive, a case's rows at a time as one zlib-compressed JSON
+# list. The bodies are near-identical rendered templates, so a blob costs a
+# small fraction of the rows it replaces, and the live table stays small.
+ARCHIVE_BATCH_ROWS = 2000
+ARCHIVE_FIELDS = ('id', 'sent_at', 'email_to', 'subject', 'body', 'status', 'error', 'bulk_id')
+
+
+def pack_notifications(rows):
+    """Compress notification rows (sent_at ascending) into an archive payload."""
+    records = [
+        [row.id, row.sent_at.isoformat(), row.email_to, row.subject, row.body,
+         row.status or 'sent', row.error, row.bulk_id]
+        for row in rows
+    ]
+    return zlib.compress(json.dumps(records, separators=(',', ':')).encode(), 9)
+
+
+def unpack_notifications(payload):
+    """Archive payload back into dicts keyed by ARCHIVE_FIELDS."""
+    records = json.loads(zlib.decompress(payload))
+    for record in records:
+        note = dict(zip(ARCHIVE_FIELDS, record))
+        note['sent_at'] = datetime.fromisoformat(note['sent_at'])
+        yield note
+
+
+def archive_notifications(days=None):
+    """Move final notifications older than `days` into the archive. Returns the count."""
+    days = current_app.config['NOTIFICATION_RETENTION_DAYS'] if days is None else days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    due = db.select(Notification.case_id, *[getattr(Notification, f) for f in ARCHIVE_FIELDS]).where(
+        Notification.sent_at < cutoff,
+        db.or_(Notification.status.is_(None), Notification.status != 'queued'),
+        ~db.exists().where(EmailOutbox.notification_id == Notification.id),
+    ).order_by(Notification.id).limit(ARCHIVE_BATCH_ROWS)
+    moved = 0
+    while True:
+        rows = db.session.execute(due).all()
+        if not rows:
+            return moved
+        rows.sort(key=lambda row: (row.case_id or 0, row.sent_at, row.id))
+        for case_id, group in groupby(rows, key=lambda row: row.case_id):
+            group = list(group)
+            db.session.add(NotificationArchive(
+                case_id=case_id, first_sent_at=group[0].sent_at, last_sent_at=group[-1].sent_at,
+                count=len(group), payload=pack_notifications(group),
+            ))
+        ids = [row.id for row in rows]
+        db.session.execute(
+            db.update(HearingReminder).where(HearingReminder.notification_id.in_(ids))
+            .values(notification_id=None)
+        )
+        db.session.execute(db.delete(Notification).where(Notification.id.in_(ids)))
+        db.session.commit()
+        moved += len(rows)
+
+
+def archived_notifications(case_id):
+    """A case's archived notifications, newest first.
+
+    Blobs are cut by id batches, so one case's blobs can overlap in time;
+    they are merged, decoding each only once the merge reaches its
+    last_sent_at, so just the overlapping blobs are held in memory.
+    """
+    blobs = db.session.execute(db.select(NotificationArchive.last_sent_at, NotificationArchive.payload).where(
+        NotificationArchive.case_id == case_id
+    ).order_by(NotificationArchive.last_sent_at.desc(), NotificationArchive.id.desc()))
+    upcoming = next(blobs, None)
+    heap, order = [], itertools.count()
+
+    def push(notes):
+        note = next(notes, None)
+        if note is not None:
+            # datetime.max - sent_at puts the newest at the top of the min-heap
+            heapq.heappush(heap, (datetime.max - note['sent_at'], next(order), note, notes))
+
+    while True:
+        while upcoming is not None and (not heap or upcoming.last_sent_at >= heap[0][2]['sent_at']):
+            push(reversed(list(unpack_notifications(upcoming.payload))))
+            upcoming = next(blobs, None)
+        if not heap:
+            return
+        _, _, note, notes = heapq.heappop(heap)
+        yield note
+        push(notes)
@@ -0,0 +1,202 @@
+"""Online SQLite snapshots: create, verify, prune and restore."""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app
+
+from .cache import CACHE_GENERATIONS, bump_generations
+from .extensions import db
+from .migrations import upgrade_db
+
+# -----------------------
+# Backups
+# -----------------------
+# Snapshots use SQLite's online backup API, BACKUP_PAGES_PER_STEP pages per
+# step. In WAL mode the copy reads inside one open read transaction, so it
+# is a consistent point-in-time image while writers carry on; in rollback
+# journal mode the source is only locked for each step. Every snapshot is
+# integrity-checked before it is gzipped into BACKUP_DIR, and the oldest
+# beyond BACKUP_KEEP are deleted.
+BACKUP_PREFIX = 'law_office-'
+BACKUP_SUFFIX = '.db.gz'
+BACKUP_CHUNK_BYTES = 1024 * 1024
+BACKUP_COMPRESSLEVEL = 3  # most of level 6's ratio at about half the CPU
+
+
+def sqlite_database_path():
+    """Path of the SQLite database file; ValueError for any other database."""
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        raise ValueError('Backups need a file-based SQLite database')
+    return url.database
+
+
+def _sqlite_connect(path):
+    return sqlite3.connect(path, timeout=current_app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000)
+
+
+def copy_database(source, target, pages=None):
+    """Copy sqlite3 connection `source` into `target` step by step. Returns the page count."""
+    totals = []
+    pinned = source.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+    if pinned:
+        # Hold one read snapshot: commits elsewhere neither wait for nor restart the copy
+        source.execute('BEGIN')
+        source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+    try:
+        source.backup(target, pages=pages or current_app.config['BACKUP_PAGES_PER_STEP'],
+                      progress=lambda status, remaining, total: totals.append(total),
+                      sleep=current_app.config['BACKUP_STEP_SLEEP_MS'] / 1000)
+    finally:
+        if pinned:
+            source.rollback()
+    return totals[-1] if totals else 0
+
+
+def remove_database_file(path):
+    """Delete a database file with any -wal/-shm files SQLite left beside it."""
+    for name in (path, path + '-wal', path + '-shm'):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def verify_database(path):
+    """PRAGMA integrity_check on a database file; returns the problems found."""
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            rows = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    return [] if rows == ['ok'] else rows
+
+
+def take_snapshot():
+    """Copy the live database to a verified temporary file. Returns (path, pages); caller deletes it."""
+    source_path = sqlite_database_path()
+    os.makedirs(current_app.config['BACKUP_DIR'], exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.db', dir=current_app.config['BACKUP_DIR'])
+    os.close(fd)
+    try:
+        source, target = _sqlite_connect(source_path), sqlite3.connect(path)
+        try:
+            pages = copy_database(source, target)
+            # The copy inherits WAL mode; a rollback-journal file stays one file
+            # when it is verified read-only, gzipped or restored
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            source.close()
+            target.close()
+        problems = verify_database(path)
+        if problems:
+            raise ValueError('snapshot failed its integrity check: ' + '; '.join(problems[:5]))
+    except BaseException:
+        remove_database_file(path)
+        raise
+    return path, pages
+
+
+def list_backups():
+    """Snapshots in BACKUP_DIR as (name, bytes, created) tuples, newest first."""
+    directory = current_app.config['BACKUP_DIR']
+    if not os.path.isdir(directory):
+        return []
+    backups = [
+        (entry.name, entry.stat().st_size, datetime.fromtimestamp(entry.stat().st_mtime))
+        for entry in os.scandir(directory)
+        if entry.name.startswith(BACKUP_PREFIX) and entry.name.endswith(BACKUP_SUFFIX)
+    ]
+    return sorted(backups, reverse=True)  # names embed a sortable UTC timestamp
+
+
+def prune_backups(keep=None):
+    """Delete all but the newest `keep` (default BACKUP_KEEP) snapshots. Returns their names."""
+    keep = max(1, current_app.config['BACKUP_KEEP'] if keep is None else keep)
+    removed = [name for name, _, _ in list_backups()[keep:]]
+    for name in removed:
+        os.remove(os.path.join(current_app.config['BACKUP_DIR'], name))
+    return removed
+
+
+def backup_name():
+    now = datetime.utcnow()
+    return f"{BACKUP_PREFIX}{now:%Y%m%d-%H%M%S}-{now.microsecond // 1000:03d}{BACKUP_SUFFIX}"
+
+
+def create_backup(keep=None, prune=True):
+    """Snapshot the database into BACKUP_DIR as .db.gz and prune old ones. Returns (path, pages)."""
+    snapshot, pages = take_snapshot()
+    path = os.path.join(current_app.config['BACKUP_DIR'], backup_name())
+    try:
+        with open(snapshot, 'rb') as src, \
+                gzip.open(path + '.part', 'wb', compresslevel=BACKUP_COMPRESSLEVEL) as dest:
+            shutil.copyfileobj(src, dest, BACKUP_CHUNK_BYTES)
+        os.replace(path + '.part', path)
+    finally:
+        remove_database_file(snapshot)
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+    if prune:
+        prune_backups(keep)
+    return path, pages
+
+
+@contextmanager
+def unpacked_backup(path):
+    """Yield a plain database file for a .db.gz snapshot (or the path itself for .db)."""
+    if not path.endswith('.gz'):
+        yield path
+        return
+    os.makedirs(current_app.config['BACKUP_DIR'], exist_ok=True)
+    fd, plain = tempfile.mkstemp(suffix='.db', dir=current_app.config['BACKUP_DIR'])
+    try:
+        with os.fdopen(fd, 'wb') as dest, gzip.open(path, 'rb') as src:
+            shutil.copyfileobj(src, dest, BACKUP_CHUNK_BYTES)
+        yield plain
+    finally:
+        remove_database_file(plain)  # snapshots from before journal_mode=DELETE open in WAL
+
+
+def verify_backup(path):
+    """Problems found decompressing and integrity-checking a snapshot (empty when sound)."""
+    try:
+        with unpacked_backup(path) as plain:
+            return verify_database(plain)
+    except (OSError, EOFError) as e:  # truncated or corrupt gzip stream
+        return [str(e)]
+
+
+def restore_database(path):
+    """Replace the live database's contents with a verified snapshot.
+
+    The current database is snapshotted first, without pruning, so the
+    snapshot being restored is never deleted as the oldest one. Returns the
+    path of that safety snapshot.
+    """
+    target_path = sqlite_database_path()
+    with unpacked_backup(path) as plain:
+        problems = verify_database(plain)
+        if problems:
+            raise ValueError('snapshot failed its integrity check: ' + '; '.join(problems[:5]))
+        safety, _ = create_backup(prune=False)
+        db.session.remove()
+        db.engine.dispose()
+        source, target = sqlite3.connect(plain), _sqlite_connect(target_path)
+        try:
+            # One step: the target stays write-locked until every page is in
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+    db.engine.dispose()
+    bump_generations(set(CACHE_GENERATIONS.values()))
+    current_app.extensions.pop('typeahead', None)
+    upgrade_db()  # the snapshot may predate the current schema
+    return safety
@@ -0,0 +1,256 @@
+"""Rendered-fragment cache and conditional GET, invalidated by generation counters."""
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from markupsafe import Markup
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .instrumentation import metrics
+from .models import Case, CaseStatusCount, Hearing, Settings
+
+# -----------------------
+# Fragment cache
+# -----------------------
+# Rendered fragments are keyed on generation counters; a commit that touches
+# a model bumps its generation, so stale entries are simply never read again
+# and age out through the LRU/TTL. The same generations drive the ETags.
+# The counters always live in the CACHE_PATH file, whichever backend holds
+# the fragments, so a write in one gunicorn worker invalidates every worker.
+CACHE_GENERATIONS = {
+    Case: 'cases', CaseStatusCount: 'cases', Hearing: 'hearings', Settings: 'settings',
+}
+
+
+class SharedGenerations:
+    """Generation counters in a SQLite file seen by every worker on the host."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_generation '
+                     '(name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        # A new file restarts the counters, so tag them to keep old ETags invalid
+        conn.execute("INSERT OR IGNORE INTO cache_generation (name, value) VALUES ('epoch', ?)",
+                     (random.getrandbits(31),))
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def generations(self):
+        return dict(self._conn().execute('SELECT name, value FROM cache_generation'))
+
+    def bump(self, names):
+        self._conn().executemany(
+            'INSERT INTO cache_generation (name, value) VALUES (?, 1) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + 1',
+            [(name,) for name in names],
+        )
+
+
+class MemoryCache:
+    """In-process LRU with a TTL; generations are shared through a SQLite file."""
+
+    def __init__(self, max_entries, ttl, generations):
+        self.max_entries, self.ttl = max_entries, ttl
+        self.entries = OrderedDict()  # key -> (value, expires)
+        self.shared = generations
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def generations(self):
+        return self.shared.generations()
+
+    def bump(self, names):
+        self.shared.bump(names)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SqliteCache(SharedGenerations):
+    """Cache file shared by every worker on the host, one connection per thread."""
+
+    def __init__(self, path, max_entries, ttl):
+        super().__init__(path)
+        self.max_entries, self.ttl = max_entries, ttl
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_entry '
+                     '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_expires ON cache_entry (expires)')
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM cache_entry WHERE key = ? AND expires >= ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)',
+                     (key, value, now + self.ttl))
+        if random.random() < 0.05:
+            # Drop expired rows, then the entries closest to expiry beyond the cap
+            conn.execute('DELETE FROM cache_entry WHERE expires < ?', (now,))
+            conn.execute('DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_entry '
+                         'ORDER BY expires DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def clear(self):
+        self._conn().execute('DELETE FROM cache_entry')
+
+
+def fragment_cache():
+    """The configured cache backend, or None when CACHE_BACKEND is 'off'."""
+    if 'fragment_cache' not in current_app.extensions:
+        backend = current_app.config['CACHE_BACKEND']
+        size, ttl = current_app.config['CACHE_MAX_ENTRIES'], current_app.config['CACHE_TTL']
+        if backend == 'sqlite':
+            cache = SqliteCache(current_app.config['CACHE_PATH'], size, ttl)
+        elif backend == 'memory':
+            cache = MemoryCache(size, ttl, SharedGenerations(current_app.config['CACHE_PATH']))
+        else:
+            cache = None
+        current_app.extensions['fragment_cache'] = cache
+    return current_app.extensions['fragment_cache']
+
+
+@contextmanager
+def fragment_cache_disabled():
+    """Render everything fresh, e.g. while counting the queries a page issues."""
+    previous = fragment_cache()
+    current_app.extensions['fragment_cache'] = None
+    try:
+        yield
+    finally:
+        current_app.extensions['fragment_cache'] = previous
+
+
+def cache_generations(*names):
+    """Current (name, generation) pairs, read once per request."""
+    cache = fragment_cache()
+    if cache is None:
+        return None
+    if has_request_context():
+        if 'cache_generations' not in g:
+            g.cache_generations = cache.generations()
+        current = g.cache_generations
+    else:
+        current = cache.generations()
+    return tuple((name, current.get(name, 0)) for name in names + ('epoch',))
+
+
+def bump_generations(names):
+    cache = fragment_cache()
+    if cache is not None and names:
+        cache.bump(sorted(names))
+        if has_request_context():
+            g.pop('cache_generations', None)
+
+
+def cached_fragment(name, depends_on, render, *key):
+    """HTML from render(), reused until a generation in depends_on moves."""
+    generations = cache_generations(*depends_on)
+    if generations is None:
+        return Markup(render())
+    cache_key = repr((name, generations, key))
+    html = fragment_cache().get(cache_key)
+    metrics['cache_requests_total'].inc(name, 'miss' if html is None else 'hit')
+    if html is None:
+        html = render()
+        fragment_cache().set(cache_key, html)
+    return Markup(html)
+
+
+def conditional_get(*depends_on):
+    """ETag a GET view on its generations and answer If-None-Match with 304.
+
+    The view must render only data covered by depends_on (plus today's date).
+    Responses carrying flashed messages are left untagged.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            generations = cache_generations(*depends_on)
+            if generations is None or request.method != 'GET' or '_flashes' in session:
+                return view(*args, **kwargs)
+            etag = hashlib.sha1(repr(
+                (request.full_path, datetime.today().date(), generations)
+            ).encode()).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def _touched_generations(session, objects):
+    for obj in objects:
+        name = CACHE_GENERATIONS.get(type(obj))
+        if name:
+            session.info.setdefault('cache_generations', set()).add(name)
+
+
+@db.event.listens_for(Session, 'after_flush')
+def _note_cache_writes(session, flush_context):
+    _touched_generations(session, session.new)
+    _touched_generations(session, session.dirty)
+    _touched_generations(session, session.deleted)
+
+
+@db.event.listens_for(Session, 'do_orm_execute')
+def _note_bulk_cache_writes(state):
+    """Bulk insert/update/delete statements (imports, seeding) skip the flush."""
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper:
+        name = CACHE_GENERATIONS.get(state.bind_mapper.class_)
+        if name:
+            state.session.info.setdefault('cache_generations', set()).add(name)
+
+
+@db.event.listens_for(Session, 'after_commit')
+def _bump_cache_generations(session):
+    bump_generations(session.info.pop('cache_generations', None))
+
+
+@db.event.listens_for(Session, 'after_rollback')
+def _forget_cache_writes(session):
+    session.info.pop('cache_generations', None)
@@ -0,0 +1,296 @@
+"""Dashboard, case CRUD, typeahead and bulk import."""
+from datetime import datetime
+
+import click
+from flask import Blueprint, flash, redirect, render_template, request, url_for
+from markupsafe import Markup
+
+from .cache import cached_fragment, conditional_get
+from .extensions import db, log
+from .imports import import_cases, read_sheet_rows
+from .models import Case, Hearing
+from .outbox import send_client_email
+from .pagination import keyset_paginate, page_size_arg
+from .search import (TYPEAHEAD_MAX_RESULTS, apply_case_filters, init_search_index,
+                     rebuild_search_index, search_backend, typeahead_index)
+from .summaries import (NEEDS_ATTENTION, actual_status_counts, needs_attention_counts,
+                        needs_attention_labels, rebuild_status_counts, status_counts)
+
+bp = Blueprint('cases', __name__, cli_group=None)
+
+
+@bp.route('/', methods=['GET'])
+@conditional_get('cases', 'hearings')
+def index():
+    search_query = request.args.get('search', '').strip().lower()
+    status_filter = request.args.get('status', 'All').strip()
+    attention = request.args.get('attention', '')
+    if attention not in NEEDS_ATTENTION:
+        attention = ''
+
+    log.debug("dashboard search=%r status=%s", search_query, status_filter)
+
+    def render_cases():
+        # --- Apply search (full-text index, best match first) and status filters ---
+        query, rank = apply_case_filters(Case.query, search_query, status_filter, attention)
+        keys = [(Case.id, True, int)]
+        if rank is not None:
+            keys.insert(0, (rank, False, float))
+
+        page = keyset_paginate(
+            query, keys, page_size_arg(),
+            after=request.args.get('after'), before=request.args.get('before'),
+        )
+        return render_template(
+            '_recent_cases.html',
+            recent_cases=page.items,
+            page=page,
+            search_query=request.args.get('search', ''),
+            status_filter=status_filter,
+            attention=attention,
+        )
+
+    def render_stats():
+        # Cards data (maintained counters, no scan of the case table)
+        counts = status_counts()
+        total_cases = sum(counts.values())
+        closed_cases = counts.get('Closed', 0)
+        return render_template(
+            '_dashboard_stats.html',
+            total_cases=total_cases,
+            active_cases=total_cases - closed_cases,
+            closed_cases=closed_cases,
+            status_counts=counts,
+        )
+
+    def render_upcoming():
+        # Join the case in the same SELECT; the table only shows number and client
+        upcoming_hearings = Hearing.query.options(
+            db.joinedload(Hearing.case).load_only(Case.case_number, Case.client_name)
+        ).filter(
+            Hearing.hearing_date >= datetime.today().date()
+        ).order_by(Hearing.hearing_date).limit(10).all()
+        return render_template('_upcoming_hearings.html', upcoming_hearings=upcoming_hearings)
+
+    def render_attention():
+        return render_template(
+            '_needs_attention.html',
+            counts=needs_attention_counts(),
+            labels=needs_attention_labels(),
+        )
+
+    if search_query or status_filter != 'All' or attention:
+        cases_html = Markup(render_cases())
+    else:
+        cases_html = cached_fragment(
+            'dashboard_cases', ['cases'], render_cases,
+            request.args.get('after'), request.args.get('before'), request.args.get('per_page'),
+        )
+
+    return render_template(
+        'dashboard.html',
+        stats_html=cached_fragment('dashboard_stats', ['cases'], render_stats),
+        attention_html=cached_fragment(
+            'needs_attention', ['cases', 'hearings'], render_attention, datetime.today().date(),
+        ),
+        upcoming_html=cached_fragment(
+            'upcoming_hearings', ['cases', 'hearings'], render_upcoming,
+            datetime.today().date(),
+        ),
+        cases_html=cases_html,
+        search_query=request.args.get('search', ''),
+        status_filter=status_filter,
+        attention=attention,
+        attention_labels=needs_attention_labels(),
+    )
+
+
+@bp.route('/cases')
+@conditional_get('cases')
+def view_cases():
+    def render_list():
+        page = keyset_paginate(
+            Case.query, [(Case.id, True, int)], page_size_arg(),
+            after=request.args.get('after'), before=request.args.get('before'),
+        )
+        return render_template('_case_list.html', cases=page.items, page=page)
+
+    cases_html = cached_fragment(
+        'case_list', ['cases'], render_list,
+        request.args.get('after'), request.args.get('before'), request.args.get('per_page'),
+    )
+    return render_template('view_cases.html', cases_html=cases_html)
+
+@bp.route('/case/add', methods=['GET','POST'])
+def add_case():
+    if request.method == 'POST':
+        data = request.form
+        cnum = data.get('case_number').strip()
+        if Case.query.filter_by(case_number=cnum).first():
+            flash('Case number already exists', 'danger')
+            return redirect(url_for('cases.add_case'))
+
+        filing_date = None
+        if data.get('filing_date'):
+            filing_date = datetime.strptime(data.get('filing_date'), '%Y-%m-%d').date()
+
+        case = Case(
+            case_number=cnum,
+            lawyer_name=data.get('lawyer_name'),
+            client_name=data.get('client_name'),
+            client_email=data.get('client_email'),
+            client_mobile=data.get('client_mobile'),
+            client_address=data.get('client_address'),
+            opponent_name=data.get('opponent_name'),
+            court_name=data.get('court_name'),
+            case_type=data.get('case_type'),
+            police_station=data.get('police_station'),
+            location=data.get('location'),
+            filing_date=filing_date,
+            status=data.get('status'),
+            description=data.get('description'),
+            total_fees=float(data.get('total_fees') or 0),
+            fees_paid=float(data.get('fees_paid') or 0),
+            notify_client=(data.get('notify_client')=='on')
+        )
+        case.recalc_fees()
+        db.session.add(case)
+        db.session.commit()
+        flash('Case added', 'success')
+        return redirect(url_for('cases.view_cases'))
+    return render_template('add_case.html')
+
+@bp.route('/case/<int:case_id>')
+@conditional_get('cases', 'hearings')
+def case_details(case_id):
+    case = Case.query.get_or_404(case_id)
+    hearings = Hearing.query.filter_by(case_id=case.id).order_by(Hearing.hearing_date.desc()).all()
+    return render_template('case_details.html', case=case, hearings=hearings)
+
+@bp.route('/case/<int:case_id>/edit', methods=['GET', 'POST'])
+def edit_case(case_id):
+    case = Case.query.get_or_404(case_id)
+    if request.method == 'POST':
+        data = request.form
+        # simple validation
+        if not data.get('case_number') or not data.get('client_name'):
+            flash('Case number and client name are required', 'danger')
+            return redirect(url_for('cases.edit_case', case_id=case.id))
+
+        # check duplicate case number (if changed)
+        other = Case.query.filter(Case.case_number == data.get('case_number'), Case.id != case.id).first()
+        if other:
+            flash('Case number already exists', 'danger')
+            return redirect(url_for('cases.edit_case', case_id=case.id))
+
+        # update fields
+        case.case_number = data.get('case_number').strip()
+        case.lawyer_name = data.get('lawyer_name')
+        case.client_name = data.get('client_name')
+        case.client_email = data.get('client_email')
+        case.client_mobile = data.get('client_mobile')
+        case.client_address = data.get('client_address')
+        case.opponent_name = data.get('opponent_name')
+        case.court_name = data.get('court_name')
+        case.case_type = data.get('case_type')
+        case.police_station = data.get('police_station')
+        case.location = data.get('location')
+        case.status = data.get('status')
+        case.description = data.get('description')
+        case.total_fees = float(data.get('total_fees') or 0)
+        case.fees_paid = float(data.get('fees_paid') or 0)
+        case.notify_client = (data.get('notify_client') == 'on')
+        case.recalc_fees()
+
+        db.session.commit()
+        # If case status changed, send client notification
+        subject = f"Case Status Updated – {case.case_number}"
+        message = (
+          f"Dear {case.client_name},\n\n"
+          f"The status of your case {case.case_number} has been updated.\n"
+          f"Current Status: {case.status}\n"
+          f"Fees Pending: {case.fees_pending}\n\n"
+          f"Regards,\n{case.lawyer_name}"
+          )
+        send_client_email(case, subject, message)
+
+        flash('Case updated successfully', 'success')
+        return redirect(url_for('cases.case_details', case_id=case.id))
+    return render_template('edit_case.html', case=case)
+
+@bp.route('/case/<int:case_id>/delete', methods=['POST'])
+def delete_case(case_id):
+    case = Case.query.get_or_404(case_id)
+    db.session.delete(case)
+    db.session.commit()
+    flash('Case deleted successfully', 'success')
+    return redirect(url_for('cases.view_cases'))
+
+
+@bp.route('/typeahead/<any(client_name, court_name, police_station, lawyer_name):field>')
+def typeahead(field):
+    """JSON suggestions for ?q= (a word prefix), most used values first."""
+    limit = max(1, min(request.args.get('limit', 10, type=int), TYPEAHEAD_MAX_RESULTS))
+    q = request.args.get('q', '')
+    return {'field': field, 'q': q, 'suggestions': [
+        {'value': value, 'count': n} for value, n in typeahead_index(field).lookup(q, limit)
+    ]}
+
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the case search index from the case table."""
+    init_search_index()
+    count = rebuild_search_index()
+    click.echo(f"Indexed {count} cases ({search_backend()} backend)")
+
+
+@bp.cli.command('case-counts')
+@click.option('--rebuild', is_flag=True, help='Recompute the counters from the case table.')
+def case_counts_command(rebuild):
+    """Verify (or rebuild) the per-status dashboard counters."""
+    if rebuild:
+        for status, n in sorted(rebuild_status_counts().items()):
+            click.echo(f"{status or '(none)'}: {n}")
+        return
+    stored, actual = status_counts(), actual_status_counts()
+    bad = sorted(k for k in set(stored) | set(actual) if stored.get(k, 0) != actual.get(k, 0))
+    for status in bad:
+        click.echo(f"{status or '(none)'}: stored {stored.get(status, 0)}, actual {actual.get(status, 0)}")
+    if bad:
+        raise click.ClickException('Counters are out of date; run with --rebuild')
+    click.echo(f"Counters OK ({sum(actual.values())} cases)")
+
+
+@bp.route('/import', methods=['GET', 'POST'])
+def import_cases_view():
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose an .xlsx or .csv file to import', 'danger')
+            return redirect(url_for('cases.import_cases_view'))
+        try:
+            report = import_cases(read_sheet_rows(upload.stream, upload.filename),
+                                  dry_run=request.form.get('dry_run') == 'on')
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('cases.import_cases_view'))
+        except Exception as e:
+            flash(f'Could not read the file: {e}', 'danger')
+            return redirect(url_for('cases.import_cases_view'))
+    return render_template('import_cases.html', report=report)
+
+
+@bp.cli.command('import-cases')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate only; write nothing.')
+def import_cases_command(path, dry_run):
+    """Import cases and hearings from an XLSX or CSV register."""
+    with open(path, 'rb') as stream:
+        report = import_cases(read_sheet_rows(stream, path), dry_run=dry_run)
+    for row_number, case_number, message in report.errors:
+        click.echo(f"row {row_number} ({case_number or '-'}): {message}")
+    verb = 'would import' if dry_run else 'imported'
+    click.echo(f"{report.rows} rows read, {verb} {report.cases} cases and "
+               f"{report.hearings} hearings, {len(report.errors)} errors")
@@ -0,0 +1,137 @@
+"""Settings read from the environment (and .env) when the app is created."""
+import os
+import sqlite3
+
+from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import event
+
+
+def configure(app):
+    load_dotenv()  # loads .env
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'devkey')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # 'auto' uses SQLite FTS5 when available, else the portable term table
+    app.config['SEARCH_BACKEND'] = os.getenv('SEARCH_BACKEND', 'auto')
+    app.config['CASES_PAGE_SIZE'] = int(os.getenv('CASES_PAGE_SIZE', 50))
+    app.config['CASES_MAX_PAGE_SIZE'] = int(os.getenv('CASES_MAX_PAGE_SIZE', 500))
+    # Typeahead indexes are rebuilt after this long to pick up other processes' writes
+    app.config['TYPEAHEAD_REFRESH_SECONDS'] = int(os.getenv('TYPEAHEAD_REFRESH_SECONDS', 300))
+    # Create tables and apply pending migrations on the first request of each process
+    app.config['AUTO_MIGRATE'] = os.getenv('AUTO_MIGRATE', '1') == '1'
+    # Outgoing mail; point SMTP_HOST/PORT at a local debugging server for tests
+    app.config['SMTP_HOST'] = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+    app.config['SMTP_PORT'] = int(os.getenv('SMTP_PORT', 587))
+    app.config['SMTP_USE_TLS'] = os.getenv('SMTP_USE_TLS', '1') == '1'
+    app.config['SMTP_AUTH'] = os.getenv('SMTP_AUTH', '1') == '1'
+    app.config['SMTP_TIMEOUT'] = float(os.getenv('SMTP_TIMEOUT', 30))
+    # 'thread' drains the outbox inside each web process, 'off' leaves it to `flask outbox-worker`
+    app.config['OUTBOX_WORKER'] = os.getenv('OUTBOX_WORKER', 'thread')
+    app.config['OUTBOX_BATCH_SIZE'] = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+    app.config['OUTBOX_MAX_ATTEMPTS'] = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+    app.config['OUTBOX_RETRY_SECONDS'] = int(os.getenv('OUTBOX_RETRY_SECONDS', 30))
+    app.config['OUTBOX_POLL_SECONDS'] = float(os.getenv('OUTBOX_POLL_SECONDS', 30))
+    # SMTP sessions used side by side when draining, and a send cap shared by every
+    # process that delivers email (0 = none)
+    app.config['OUTBOX_CONCURRENCY'] = int(os.getenv('OUTBOX_CONCURRENCY', 3))
+    app.config['OUTBOX_RATE_PER_MINUTE'] = int(os.getenv('OUTBOX_RATE_PER_MINUTE', 60))
+    # `flask archive-notifications` moves notifications older than this into the
+    # compressed archive table; the history page lists this many per page
+    app.config['NOTIFICATION_RETENTION_DAYS'] = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 365))
+    app.config['NOTIFICATIONS_PAGE_SIZE'] = int(os.getenv('NOTIFICATIONS_PAGE_SIZE', 50))
+    # Online snapshots (`flask db-backup`, /admin/backups): where they go, how many
+    # are kept, and pages copied per backup step with a pause between steps
+    app.config['BACKUP_DIR'] = os.getenv('BACKUP_DIR', os.path.join(app.instance_path, 'backups'))
+    app.config['BACKUP_KEEP'] = int(os.getenv('BACKUP_KEEP', 14))
+    app.config['BACKUP_PAGES_PER_STEP'] = int(os.getenv('BACKUP_PAGES_PER_STEP', 1024))
+    app.config['BACKUP_STEP_SLEEP_MS'] = float(os.getenv('BACKUP_STEP_SLEEP_MS', 5))
+    # PDF case files and cause lists: rendering processes per web process for ZIP
+    # batches (0 = one per CPU), an optional TTF font for names beyond Latin-1,
+    # and the most case files one download may hold
+    app.config['PDF_WORKERS'] = int(os.getenv('PDF_WORKERS', 2))
+    app.config['PDF_FONT_PATH'] = os.getenv('PDF_FONT_PATH') or None
+    app.config['PDF_MAX_CASES'] = int(os.getenv('PDF_MAX_CASES', 2000))
+    # Open cases with no hearing for this many days show as idle on the dashboard
+    app.config['NEEDS_ATTENTION_IDLE_DAYS'] = int(os.getenv('NEEDS_ATTENTION_IDLE_DAYS', 90))
+    # Hearing reminders: look-ahead window, daily run time for --loop, emails per SMTP session
+    app.config['REMINDER_DAYS'] = int(os.getenv('REMINDER_DAYS', 2))
+    app.config['REMINDER_TIME'] = os.getenv('REMINDER_TIME', '07:00')
+    app.config['REMINDER_BATCH_SIZE'] = int(os.getenv('REMINDER_BATCH_SIZE', 500))
+    # Window of hearings published in the calendar.ics subscription feed
+    app.config['CALENDAR_FEED_PAST_DAYS'] = int(os.getenv('CALENDAR_FEED_PAST_DAYS', 30))
+    app.config['CALENDAR_FEED_DAYS'] = int(os.getenv('CALENDAR_FEED_DAYS', 180))
+    # Rendered-fragment cache: 'memory' (LRU per process), 'sqlite' (one file shared by
+    # every worker on the host) or 'off'. Either way the invalidation counters live in
+    # CACHE_PATH, so all gunicorn workers drop stale pages and ETags on every write
+    app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'memory')
+    app.config['CACHE_PATH'] = os.getenv('CACHE_PATH', os.path.join(app.instance_path, 'cache.sqlite3'))
+    app.config['CACHE_TTL'] = int(os.getenv('CACHE_TTL', 300))
+    app.config['CACHE_MAX_ENTRIES'] = int(os.getenv('CACHE_MAX_ENTRIES', 512))
+    # Compiled templates are stored here so new processes skip Jinja's parse and
+    # compile step ('' turns the bytecode cache off)
+    app.config['JINJA_CACHE_DIR'] = os.getenv('JINJA_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+    if app.config['JINJA_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR'])
+    # Statements slower than this are logged with their SQL
+    app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 200))
+    # With METRICS_DIR set, each process writes its metrics there and /metrics
+    # adds them up, so a scrape covers every gunicorn worker.
+    app.config['METRICS_DIR'] = os.getenv('METRICS_DIR')
+
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    # Applied to every new SQLite connection. WAL lets readers run alongside the
+    # single writer; NORMAL sync is durable across app crashes in WAL mode.
+    app.config['SQLITE_PRAGMAS'] = [
+        f"journal_mode={os.getenv('SQLITE_JOURNAL_MODE', 'WAL')}",
+        f"synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}",
+        f"mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+        f"cache_size={int(os.getenv('SQLITE_CACHE_SIZE', -64000))}",  # negative = KiB
+    ]
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'], app.config['SQLITE_BUSY_TIMEOUT_MS'])
+
+# -----------------------
+# Database engine profile
+# -----------------------
+def database_uri():
+    """DATABASE_URL from the environment, defaulting to the SQLite file in instance/."""
+    uri = os.getenv('DATABASE_URL', 'sqlite:///law_office.db')
+    if uri.startswith('postgres://'):  # Heroku-style URL; SQLAlchemy wants postgresql://
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri, busy_timeout_ms):
+    """Connection pool settings for one worker process."""
+    if uri in ('sqlite://', 'sqlite:///:memory:'):
+        return {}
+    if uri.startswith('sqlite'):
+        # Writers serialize on the file lock; a few connections per worker
+        # cover the request thread plus the outbox thread.
+        return {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 5)),
+            'connect_args': {'timeout': busy_timeout_ms / 1000},
+        }
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run SQLITE_PRAGMAS on every new connection of engine."""
+    @event.listens_for(engine, 'connect')
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f'PRAGMA {pragma}')
+        cursor.close()
@@ -0,0 +1,479 @@
+"""CSV/XLSX exports, fee reports and PDF case files and cause lists."""
+import csv
+import heapq
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
+from datetime import datetime
+
+import click
+from flask import (Blueprint, Response, current_app, flash, redirect, render_template, request,
+                   stream_with_context, url_for)
+
+from .archive import archived_notifications
+from .extensions import db
+from .hearings import calendar_entries
+from .models import CASE_STATUSES, Case, FeeSummary, Hearing, Notification, Settings
+from .pdfs import ensure_pdf_kit, init_pdf_worker, render_case_batch, render_case_pdf, render_cause_list_pdf
+from .search import apply_case_filters
+from .summaries import rebuild_fee_summary
+
+bp = Blueprint('exports', __name__, cli_group=None)
+
+
+# -----------------------
+# Exports
+# -----------------------
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_CHUNK_ROWS = 1000
+
+
+def stream_rows(stmt):
+    """Yield result rows from a server-side cursor, EXPORT_CHUNK_ROWS at a time."""
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+    for partition in result.partitions():
+        yield from partition
+
+
+def _csv_chunks(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _xlsx_chunks(title, header, rows):
+    # write_only keeps one row in memory at a time; openpyxl spools the sheet
+    # to disk and the finished file is streamed back in 64 KiB pieces.
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+    strip_illegal = ILLEGAL_CHARACTERS_RE.sub
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(header)
+    for row in rows:
+        ws.append([strip_illegal('', v) if isinstance(v, str) else v for v in row])
+    with tempfile.TemporaryFile() as output:
+        wb.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_response(filename, fmt, title, header, rows):
+    """Stream rows as a CSV or XLSX download without building it in memory."""
+    filename = re.sub(r'[^\w.-]+', '_', filename)
+    if fmt == 'csv':
+        body, mimetype = _csv_chunks(header, rows), 'text/csv'
+    else:
+        body, mimetype = _xlsx_chunks(title, header, rows), XLSX_MIMETYPE
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+def export_cases_rows(search_text, status):
+    stmt = db.select(
+        Case.case_number, Case.client_name, Case.client_mobile, Case.client_email,
+        Case.opponent_name, Case.lawyer_name, Case.court_name, Case.case_type,
+        Case.police_station, Case.location, Case.filing_date, Case.status,
+        Case.total_fees, Case.fees_paid, Case.fees_pending,
+    )
+    stmt, rank = apply_case_filters(stmt, search_text, status)
+    stmt = stmt.order_by(*([rank] if rank is not None else []), Case.id.desc())
+    header = ["Case No", "Client", "Mobile", "Email", "Opponent", "Lawyer", "Court",
+              "Case Type", "Police Station", "Location", "Filing Date", "Status",
+              "Total Fees", "Fees Paid", "Fees Pending"]
+    return header, stream_rows(stmt)
+
+
+def export_hearings_rows(search_text, status):
+    stmt = db.select(
+        Case.case_number, Case.client_name, Case.court_name, Hearing.hearing_date,
+        Hearing.stage, Hearing.next_hearing_date, Hearing.updated_status, Hearing.notes,
+    ).join(Case, Hearing.case_id == Case.id)
+    stmt, _ = apply_case_filters(stmt, search_text, status)
+    # Walk ix_hearing_hearing_date so rows flow without a sort step
+    stmt = stmt.order_by(Hearing.hearing_date.desc())
+    header = ["Case No", "Client", "Court", "Hearing Date", "Stage", "Next Hearing",
+              "Updated Status", "Notes"]
+    return header, stream_rows(stmt)
+
+
+def export_fees_rows(search_text, status):
+    stmt = db.select(
+        Case.case_number, Case.client_name, Case.lawyer_name, Case.court_name,
+        Case.status, Case.total_fees, Case.fees_paid, Case.fees_pending,
+    )
+    stmt, rank = apply_case_filters(stmt, search_text, status)
+    stmt = stmt.order_by(*([rank] if rank is not None else []), Case.id.desc())
+    header = ["Case No", "Client", "Lawyer", "Court", "Status", "Total Fees", "Fees Paid",
+              "Fees Pending"]
+
+    def with_totals():
+        total = paid = pending = 0.0
+        for row in stream_rows(stmt):
+            total += row.total_fees or 0
+            paid += row.fees_paid or 0
+            pending += row.fees_pending or 0
+            yield row
+        yield ("TOTAL", None, None, None, None, total, paid, pending)
+    return header, with_totals()
+
+
+EXPORTS = {
+    'cases': ("Cases", export_cases_rows),
+    'hearings': ("Hearings", export_hearings_rows),
+    'fees': ("Fees", export_fees_rows),
+}
+
+
+@bp.route('/export/<any(cases, hearings, fees):kind>.<any(csv, xlsx):fmt>')
+def export_data(kind, fmt):
+    """Firm-wide export, filtered like the dashboard (?search=&status=)."""
+    title, build = EXPORTS[kind]
+    search_text = request.args.get('search', '').strip().lower()
+    status = request.args.get('status', 'All').strip()
+    header, rows = build(search_text, status)
+    filename = f"{title}_{datetime.today():%Y-%m-%d}"
+    return export_response(filename, fmt, title, header, rows)
+
+
+@bp.route('/case/<int:case_id>/notifications/export')
+def export_notifications(case_id):
+    case = Case.query.get_or_404(case_id)
+    fmt = 'csv' if request.args.get('format') == 'csv' else 'xlsx'
+    stmt = db.select(
+        Notification.sent_at, Notification.email_to, Notification.subject,
+        Notification.body, Notification.status,
+    ).filter_by(case_id=case_id).order_by(Notification.sent_at.desc())
+    # Both streams are newest first; merging keeps rows still queued at archive time in place
+    notes = heapq.merge((row._mapping for row in stream_rows(stmt)), archived_notifications(case_id),
+                        key=lambda n: n['sent_at'], reverse=True)
+    rows = (
+        (n['sent_at'].strftime("%d:%m:%Y %H:%M"), n['email_to'], n['subject'], n['body'],
+         n['status'] or 'sent')
+        for n in notes
+    )
+    return export_response(
+        f"Case_{case.case_number}_Notifications", fmt, "Notifications",
+        ["Date Sent", "To", "Subject", "Body", "Status"], rows,
+    )
+
+
+# -----------------------
+# PDFs
+# -----------------------
+# Case files (case fields plus hearing history) and daily cause lists as
+# PDFs (rendered by .pdfs). Single documents render in the request. Batches
+# of case files are read from the database here, PDF_BATCH_CASES at a time,
+# and rendered in a pool of PDF_WORKERS processes that register fonts and
+# build styles and page templates once each; finished files are streamed
+# out as a ZIP. ReportLab is imported on first use, like openpyxl.
+PDF_BATCH_CASES = 25
+_pdf_pool_lock = threading.Lock()
+
+
+def pdf_kit():
+    """Fonts and styles for rendering inside this (web) process."""
+    return ensure_pdf_kit(current_app.config['PDF_FONT_PATH'])
+
+
+def pdf_pool():
+    """This process's PDF rendering pool, started on first use."""
+    from concurrent.futures import ProcessPoolExecutor
+    with _pdf_pool_lock:
+        pool = current_app.extensions.get('pdf_pool')
+        if pool is None:
+            # spawn: never fork a web process that has threads and open connections
+            pool = current_app.extensions['pdf_pool'] = ProcessPoolExecutor(
+                max_workers=current_app.config['PDF_WORKERS'] or None,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_pdf_worker, initargs=(current_app.config['PDF_FONT_PATH'],),
+            )
+        return pool
+
+
+def pdf_office():
+    settings = Settings.query.first()
+    name = settings.lawyer_name if settings and settings.lawyer_name else ''
+    return f'{name} – Law Office' if name else 'Law Office'
+
+
+def pdf_filename(case_number):
+    return 'Case_' + re.sub(r'[^\w.-]+', '_', case_number or '') + '.pdf'
+
+
+def _case_dict(case):
+    return {c.key: getattr(case, c.key) for c in Case.__table__.columns}
+
+
+def case_pdf_batches(query):
+    """Yield [(file name, case dict, hearing dicts)] for the query's cases, in id order."""
+    last_id, names = 0, set()
+    while True:
+        cases = query.filter(Case.id > last_id).order_by(Case.id).limit(PDF_BATCH_CASES).all()
+        if not cases:
+            return
+        last_id = cases[-1].id
+        hearings = {}
+        for h in Hearing.query.filter(Hearing.case_id.in_([c.id for c in cases])).order_by(
+                Hearing.case_id, Hearing.hearing_date.desc(), Hearing.id.desc()):
+            hearings.setdefault(h.case_id, []).append(
+                {c.key: getattr(h, c.key) for c in Hearing.__table__.columns})
+        batch = []
+        for case in cases:
+            name = pdf_filename(case.case_number)
+            if name in names:
+                name = name[:-4] + f'_{case.id}.pdf'
+            names.add(name)
+            batch.append((name, _case_dict(case), hearings.get(case.id, [])))
+        db.session.expunge_all()  # keep the identity map from growing with the batch
+        yield batch
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only stream that hands what zipfile writes back to a generator."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_case_pdfs(query):
+    """ZIP bytes of one PDF per case, rendered in the pool and streamed as they finish."""
+    pool, office = pdf_pool(), pdf_office()
+    ahead = 2 * (current_app.config['PDF_WORKERS'] or os.cpu_count() or 1)
+    sink = _ZipSink()
+    # PDFs are already compressed; storing them keeps this process off the CPU
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED)
+    pending = deque()
+
+    def write(future):
+        for name, pdf in future.result():
+            archive.writestr(name, pdf)
+        return sink.drain()
+
+    for batch in case_pdf_batches(query):
+        pending.append(pool.submit(render_case_batch, batch, office))
+        if len(pending) >= ahead:
+            yield write(pending.popleft())
+    while pending:
+        yield write(pending.popleft())
+    archive.close()
+    yield sink.drain()
+
+
+@bp.route('/case/<int:case_id>/pdf')
+def case_pdf(case_id):
+    case = Case.query.get_or_404(case_id)
+    hearings = Hearing.query.filter_by(case_id=case.id).order_by(
+        Hearing.hearing_date.desc(), Hearing.id.desc()).all()
+    pdf_kit()
+    pdf = render_case_pdf(_case_dict(case), [
+        {c.key: getattr(h, c.key) for c in Hearing.__table__.columns} for h in hearings
+    ], pdf_office())
+    return Response(pdf, mimetype='application/pdf',
+                    headers={'Content-Disposition': f'inline; filename="{pdf_filename(case.case_number)}"'})
+
+
+@bp.route('/cases.zip')
+def case_pdfs_zip():
+    """Case files for every case matching the dashboard filters, as a ZIP of PDFs."""
+    query, _ = apply_case_filters(
+        Case.query, request.args.get('search', '').strip().lower(),
+        request.args.get('status', 'All').strip(), request.args.get('attention'),
+    )
+    total = query.count()
+    if total > current_app.config['PDF_MAX_CASES']:
+        flash(f"{total} cases match; narrow the filters to at most "
+              f"{current_app.config['PDF_MAX_CASES']} for one download", 'danger')
+        return redirect(url_for('cases.index', search=request.args.get('search') or None,
+                                status=request.args.get('status') or None,
+                                attention=request.args.get('attention') or None))
+    return Response(
+        stream_with_context(stream_case_pdfs(query)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="Case_files_{datetime.today():%Y-%m-%d}.zip"'},
+    )
+
+
+@bp.route('/calendar.pdf')
+def cause_list_pdf():
+    """A day's cause list (?date=, optional ?lawyer=) as a PDF."""
+    try:
+        day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        day = datetime.today().date()
+    lawyer = request.args.get('lawyer', '').strip() or None
+    entries = calendar_entries(day, day, lawyer)
+    pdf_kit()
+    pdf = render_cause_list_pdf(day, entries, pdf_office(), lawyer)
+    return Response(pdf, mimetype='application/pdf',
+                    headers={'Content-Disposition': f'inline; filename="Cause_list_{day.isoformat()}.pdf"'})
+
+
+@bp.cli.command('case-pdfs')
+@click.argument('out', type=click.Path(dir_okay=False, writable=True))
+@click.option('--status', default='All', help='Only cases with this status.')
+@click.option('--search', default='', help='Dashboard search text.')
+def case_pdfs_command(out, status, search):
+    """Write case-file PDFs for the matching cases into a ZIP."""
+    start = time.perf_counter()
+    query, _ = apply_case_filters(Case.query, search.strip().lower(), status)
+    with open(out, 'wb') as f:
+        for chunk in stream_case_pdfs(query):
+            f.write(chunk)
+    with zipfile.ZipFile(out) as archive:
+        count = len(archive.namelist())
+    click.echo(f"{count} case files written to {out} in {time.perf_counter() - start:.1f}s")
+
+
+# -----------------------
+# Reports
+# -----------------------
+REPORT_GROUPS = {
+    'lawyer': ('Lawyer', FeeSummary.lawyer_name),
+    'court': ('Court', FeeSummary.court_name),
+    'case_type': ('Case type', FeeSummary.case_type),
+    'month': ('Filing month', FeeSummary.filing_month),
+    'status': ('Status', FeeSummary.status),
+}
+_MONTH_RE = re.compile(r'^\d{4}-\d{2}$')
+
+
+def report_filters():
+    """(group, from month, to month, status) from the query string."""
+    group = request.args.get('group', 'lawyer')
+    if group not in REPORT_GROUPS:
+        group = 'lawyer'
+    start = request.args.get('from', '').strip()
+    end = request.args.get('to', '').strip()
+    status = request.args.get('status', 'All').strip()
+    return (group, start if _MONTH_RE.match(start) else '',
+            end if _MONTH_RE.match(end) else '', status)
+
+
+def fee_report_statement(group, start='', end='', status='All'):
+    """One row per group value with totals and window-function shares.
+
+    `start`/`end` are inclusive YYYY-MM filing months; `status` is 'All',
+    'Open' (anything but Closed) or a single status.
+    """
+    _, column = REPORT_GROUPS[group]
+    cases = db.func.sum(FeeSummary.cases)
+    pending = db.func.sum(FeeSummary.fees_pending)
+    all_pending = db.func.nullif(db.func.sum(pending).over(), 0)
+    # Months read chronologically; every other grouping by money owed
+    order = [column] if group == 'month' else [pending.desc(), column]
+    stmt = db.select(
+        column.label('name'),
+        cases.label('cases'),
+        db.func.sum(db.case((FeeSummary.status != 'Closed', FeeSummary.cases), else_=0))
+        .label('open_cases'),
+        db.func.sum(FeeSummary.total_fees).label('total_fees'),
+        db.func.sum(FeeSummary.fees_paid).label('fees_paid'),
+        pending.label('fees_pending'),
+        (100.0 * pending / all_pending).label('share'),
+        (100.0 * db.func.sum(pending).over(order_by=order, rows=(None, 0)) / all_pending)
+        .label('cumulative'),
+    ).group_by(column).having(cases > 0).order_by(*order)
+    if start:
+        stmt = stmt.where(FeeSummary.filing_month >= start)
+    if end:
+        stmt = stmt.where(FeeSummary.filing_month <= end, FeeSummary.filing_month != '')
+    if status == 'Open':
+        stmt = stmt.where(FeeSummary.status != 'Closed')
+    elif status and status != 'All':
+        stmt = stmt.where(FeeSummary.status == status)
+    return stmt
+
+
+def fee_report_totals(stmt):
+    sub = stmt.order_by(None).subquery()
+    return db.session.execute(db.select(
+        db.func.coalesce(db.func.sum(sub.c.cases), 0).label('cases'),
+        db.func.coalesce(db.func.sum(sub.c.open_cases), 0).label('open_cases'),
+        db.func.coalesce(db.func.sum(sub.c.total_fees), 0.0).label('total_fees'),
+        db.func.coalesce(db.func.sum(sub.c.fees_paid), 0.0).label('fees_paid'),
+        db.func.coalesce(db.func.sum(sub.c.fees_pending), 0.0).label('fees_pending'),
+    )).one()
+
+
+@bp.route('/reports')
+def reports():
+    group, start, end, status = report_filters()
+    stmt = fee_report_statement(group, start, end, status)
+    return render_template(
+        'reports.html',
+        rows=db.session.execute(stmt).all(),
+        totals=fee_report_totals(stmt),
+        groups=REPORT_GROUPS, group=group, start=start, end=end, status=status,
+        statuses=CASE_STATUSES,
+    )
+
+
+@bp.route('/reports.<any(csv, xlsx):fmt>')
+def export_report(fmt):
+    group, start, end, status = report_filters()
+    label, _ = REPORT_GROUPS[group]
+    rows = (
+        (r.name or '(none)', r.cases, r.open_cases, r.total_fees, r.fees_paid, r.fees_pending,
+         round(r.share or 0, 2), round(r.cumulative or 0, 2))
+        for r in stream_rows(fee_report_statement(group, start, end, status))
+    )
+    return export_response(
+        f"Fees_by_{group}_{datetime.today():%Y-%m-%d}", fmt, "Fees",
+        [label, "Cases", "Open", "Billed", "Collected", "Outstanding",
+         "Share of outstanding %", "Cumulative %"], rows,
+    )
+
+
+@bp.cli.command('fee-summary')
+@click.option('--rebuild', is_flag=True, help='Recompute the summary from the case table.')
+def fee_summary_command(rebuild):
+    """Verify (or rebuild) the fee report summary table."""
+    if rebuild:
+        rebuild_fee_summary()
+        click.echo(f"Rebuilt fee summary ({FeeSummary.query.count()} rows)")
+        return
+    stored = db.session.execute(db.select(
+        db.func.coalesce(db.func.sum(FeeSummary.cases), 0),
+        db.func.round(db.func.coalesce(db.func.sum(FeeSummary.fees_pending), 0.0), 2),
+    )).one()
+    actual = db.session.execute(db.select(
+        db.func.count(Case.id),
+        db.func.round(db.func.coalesce(db.func.sum(Case.fees_pending), 0.0), 2),
+    )).one()
+    click.echo(f"stored {stored[0]} cases, {stored[1]:.2f} outstanding; "
+               f"actual {actual[0]} cases, {actual[1]:.2f} outstanding")
+    if tuple(stored) != tuple(actual):
+        raise click.ClickException('Fee summary is out of date; run with --rebuild')
@@ -0,0 +1,7 @@
+"""Objects shared by every module, bound to the app in create_app()."""
+import logging
+
+from flask_sqlalchemy import SQLAlchemy
+
+log = logging.getLogger('law_office')
+db = SQLAlchemy()
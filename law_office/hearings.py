@@ -0,0 +1,394 @@
+"""Hearing CRUD, reminder emails and the cause-list calendar."""
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+
+from .cache import cached_fragment, conditional_get
+from .extensions import db
+from .models import Case, EmailOutbox, Hearing, HearingReminder, Notification, Settings
+from .outbox import drain_outbox, send_client_email
+from .search import typeahead_index
+from .summaries import rebuild_hearing_summary, stale_hearing_summaries
+
+bp = Blueprint('hearings', __name__, cli_group=None)
+
+
+# -----------------------
+# Hearing CRUD
+# -----------------------
+
+@bp.route('/case/<int:case_id>/hearing/add', methods=['GET', 'POST'])
+def add_hearing(case_id):
+    case = Case.query.get_or_404(case_id)
+    if request.method == 'POST':
+        data = request.form
+        hearing_date = datetime.strptime(data.get('hearing_date'), '%Y-%m-%d').date() if data.get('hearing_date') else None
+        next_hearing_date = datetime.strptime(data.get('next_hearing_date'), '%Y-%m-%d').date() if data.get('next_hearing_date') else None
+
+        h = Hearing(
+            case_id=case.id,
+            hearing_date=hearing_date,
+            stage=data.get('stage'),
+            notes=data.get('notes'),
+            next_hearing_date=next_hearing_date,
+            updated_status=data.get('updated_status')
+        )
+        db.session.add(h)
+
+        # Update case status if given
+        if data.get('updated_status'):
+            case.status = data.get('updated_status')
+
+        db.session.commit()
+
+        # ---- Email Notification ----
+        subject = f"New Hearing Added – Case {case.case_number}"
+        message = (
+            f"Dear {case.client_name},\n\n"
+            f"A new hearing has been scheduled for your case {case.case_number}.\n"
+            f"Hearing Date: {data.get('hearing_date')}\n"
+            f"Stage: {data.get('stage')}\n"
+            f"Next Hearing Date: {data.get('next_hearing_date')}\n"
+            f"Current Case Status: {case.status}\n\n"
+            f"Regards,\n{case.lawyer_name}"
+        )
+        send_client_email(case, subject, message)
+
+        flash('Hearing added successfully', 'success')
+        return redirect(url_for('cases.case_details', case_id=case.id))
+
+    # ✅ Always return a response for GET
+    return render_template('add_hearing.html', case=case)
+
+
+@bp.route('/hearing/<int:hearing_id>/edit', methods=['GET', 'POST'])
+def edit_hearing(hearing_id):
+    hearing = Hearing.query.options(db.joinedload(Hearing.case)).filter_by(id=hearing_id).first_or_404()
+    case = hearing.case
+    if request.method == 'POST':
+        data = request.form
+        hearing.hearing_date = datetime.strptime(data.get('hearing_date'), '%Y-%m-%d').date()
+        hearing.stage = data.get('stage')
+        hearing.notes = data.get('notes')
+        hearing.next_hearing_date = datetime.strptime(data.get('next_hearing_date'), '%Y-%m-%d').date() if data.get('next_hearing_date') else None
+        hearing.updated_status = data.get('updated_status')
+
+        # Update case status automatically if changed
+        if data.get('updated_status'):
+            case.status = data.get('updated_status')
+
+        db.session.commit()
+        flash('Hearing updated successfully', 'success')
+        return redirect(url_for('cases.case_details', case_id=case.id))
+
+    return render_template('edit_hearing.html', hearing=hearing, case=case)
+
+
+@bp.route('/hearing/<int:hearing_id>/delete', methods=['POST'])
+def delete_hearing(hearing_id):
+    hearing = Hearing.query.get_or_404(hearing_id)
+    cid = hearing.case_id
+    db.session.delete(hearing)
+    db.session.commit()
+    flash('Hearing deleted successfully', 'success')
+    return redirect(url_for('cases.case_details', case_id=cid))
+
+
+# -----------------------
+# Hearing reminders
+# -----------------------
+def due_reminders(today, days):
+    """Hearings in [today, today + days] whose clients should be reminded.
+
+    One query over the hearing_date and next_hearing_date indexes, joined to
+    the case columns the message needs. Returns dicts keyed by (case, date),
+    so a date recorded both as a hearing and as a previous hearing's next
+    date produces one reminder.
+    """
+    end = today + timedelta(days=days)
+    stmt = (
+        db.select(
+            Hearing.hearing_date, Hearing.next_hearing_date, Hearing.stage, Hearing.case_id,
+            Case.case_number, Case.client_name, Case.client_email, Case.lawyer_name,
+            Case.court_name,
+        )
+        .join(Case, Hearing.case_id == Case.id)
+        .where(db.or_(Hearing.hearing_date.between(today, end),
+                      Hearing.next_hearing_date.between(today, end)))
+        .where(Case.notify_client.is_(True), Case.client_email.isnot(None),
+               Case.client_email != '',
+               db.or_(Case.status.is_(None), Case.status != 'Closed'))
+    )
+    due = {}
+    for row in db.session.execute(stmt):
+        for hearing_on, stage in ((row.hearing_date, row.stage), (row.next_hearing_date, None)):
+            if hearing_on is None or not today <= hearing_on <= end:
+                continue
+            entry = due.setdefault((row.case_id, hearing_on), {
+                'case_id': row.case_id, 'case_number': row.case_number,
+                'client_name': row.client_name, 'client_email': row.client_email,
+                'lawyer_name': row.lawyer_name, 'court_name': row.court_name,
+                'hearing_on': hearing_on, 'stage': None,
+            })
+            if stage:
+                entry['stage'] = stage
+    return due
+
+
+def reminder_message(r):
+    subject = f"Hearing Reminder – Case {r['case_number']} on {r['hearing_on']:%d-%m-%Y}"
+    body = (
+        f"Dear {r['client_name']},\n\n"
+        f"This is a reminder that your case {r['case_number']} is listed for hearing on "
+        f"{r['hearing_on']:%d-%m-%Y}"
+        + (f" at {r['court_name']}" if r['court_name'] else "") + ".\n"
+        + (f"Stage: {r['stage']}\n" if r.get('stage') else "")
+        + f"\nRegards,\n{r['lawyer_name']}"
+    )
+    return subject, body
+
+
+def queue_hearing_reminders(today=None, days=None, dry_run=False):
+    """Queue reminder emails for upcoming hearings; safe to run repeatedly.
+
+    Reminders already logged today are skipped. New Notification, outbox
+    and HearingReminder rows are written with bulk inserts in a single
+    transaction. Returns the number of reminders queued.
+    """
+    today = today or datetime.today().date()
+    days = current_app.config['REMINDER_DAYS'] if days is None else days
+    settings = Settings.query.first()
+    if not settings or not settings.email_notifications_enabled:
+        return 0
+
+    due = due_reminders(today, days)
+    done = set(db.session.execute(
+        db.select(HearingReminder.case_id, HearingReminder.hearing_on)
+        .where(HearingReminder.sent_on == today)
+    ).tuples())
+    todo = [r for key, r in sorted(due.items()) if key not in done]
+    if dry_run or not todo:
+        return len(todo)
+
+    now = datetime.utcnow()
+    notes = []
+    for r in todo:
+        subject, body = reminder_message(r)
+        notes.append(dict(case_id=r['case_id'], email_to=r['client_email'], subject=subject,
+                          body=body, sent_at=now, status='queued'))
+    note_ids = db.session.execute(
+        db.insert(Notification).returning(Notification.id, sort_by_parameter_order=True), notes
+    ).scalars().all()
+    db.session.execute(db.insert(EmailOutbox), [
+        dict(notification_id=nid, attempts=0, next_attempt_at=now) for nid in note_ids])
+    db.session.execute(db.insert(HearingReminder), [
+        dict(case_id=r['case_id'], hearing_on=r['hearing_on'], sent_on=today, notification_id=nid)
+        for r, nid in zip(todo, note_ids)])
+    db.session.commit()
+    return len(todo)
+
+
+def run_hearing_reminders(days=None, dry_run=False):
+    """Queue today's reminders and deliver them in large SMTP batches."""
+    queued = queue_hearing_reminders(days=days, dry_run=dry_run)
+    sent = failed = 0
+    if queued and not dry_run:
+        sent, failed = drain_outbox(current_app.config['REMINDER_BATCH_SIZE'])
+    return queued, sent, failed
+
+
+def _seconds_until(hhmm):
+    hour, minute = (int(x) for x in hhmm.split(':'))
+    now = datetime.now()
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+@bp.cli.command('send-reminders')
+@click.option('--days', type=int, default=None, help='Look-ahead window (default REMINDER_DAYS).')
+@click.option('--dry-run', is_flag=True, help='Count the reminders without queueing them.')
+@click.option('--loop', is_flag=True, help='Keep running, once a day at REMINDER_TIME.')
+def send_reminders_command(days, dry_run, loop):
+    """Email clients about hearings in the next few days."""
+    while True:
+        if loop:
+            time.sleep(_seconds_until(current_app.config['REMINDER_TIME']))
+        start = time.perf_counter()
+        queued, sent, failed = run_hearing_reminders(days, dry_run)
+        verb = 'due' if dry_run else 'queued'
+        click.echo(f"{queued} reminders {verb}, {sent} sent, {failed} failed "
+                   f"in {time.perf_counter() - start:.1f}s")
+        if not loop:
+            return
+
+
+# -----------------------
+# Calendar
+# -----------------------
+CALENDAR_VIEWS = ('day', 'week', 'month')
+
+
+def calendar_entries(start, end, lawyer=None):
+    """Hearings on days in [start, end], ordered by date, court and case number.
+
+    Like due_reminders: one bounded query over the hearing_date and
+    next_hearing_date indexes, projecting only the columns a cause list
+    shows. A date that is both a hearing and a previous hearing's next
+    date appears once, with the hearing's stage.
+    """
+    stmt = (
+        db.select(
+            Hearing.id, Hearing.hearing_date, Hearing.next_hearing_date, Hearing.stage,
+            Hearing.case_id, Case.case_number, Case.client_name, Case.opponent_name,
+            Case.court_name, Case.lawyer_name,
+        )
+        .join(Case, Hearing.case_id == Case.id)
+        .where(db.or_(Hearing.hearing_date.between(start, end),
+                      Hearing.next_hearing_date.between(start, end)))
+    )
+    if lawyer:
+        stmt = stmt.where(Case.lawyer_name == lawyer)
+    entries = {}
+    for row in db.session.execute(stmt):
+        for on, stage in ((row.hearing_date, row.stage), (row.next_hearing_date, None)):
+            if on is None or not start <= on <= end:
+                continue
+            entry = entries.setdefault((row.case_id, on), {
+                'uid': f"{'hearing' if stage is not None else 'next'}-{row.id}",
+                'case_id': row.case_id, 'case_number': row.case_number,
+                'client_name': row.client_name, 'opponent_name': row.opponent_name,
+                'court_name': row.court_name or '', 'lawyer_name': row.lawyer_name,
+                'on': on, 'stage': None,
+            })
+            if stage is not None:
+                entry['uid'], entry['stage'] = f"hearing-{row.id}", stage
+    return sorted(entries.values(),
+                  key=lambda e: (e['on'], e['court_name'], e['case_number']))
+
+
+def calendar_range(view, day):
+    """First and last day of the day/week/month around `day`, plus prev/next anchors."""
+    if view == 'day':
+        return day, day, day - timedelta(days=1), day + timedelta(days=1)
+    if view == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6), start - timedelta(days=7), start + timedelta(days=7)
+    start = day.replace(day=1)
+    following = (start + timedelta(days=32)).replace(day=1)
+    return start, following - timedelta(days=1), (start - timedelta(days=1)).replace(day=1), following
+
+
+def calendar_lawyers():
+    """Lawyer names for the filter, from the lawyer_name typeahead index."""
+    return typeahead_index('lawyer_name').values()
+
+
+@bp.route('/calendar')
+@conditional_get('cases', 'hearings')
+def calendar_view():
+    """Cause list for a day, week or month, grouped by date and court."""
+    view = request.args.get('view', 'week')
+    if view not in CALENDAR_VIEWS:
+        view = 'week'
+    try:
+        day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        day = datetime.today().date()
+    lawyer = request.args.get('lawyer', '').strip()
+    start, end, prev_day, next_day = calendar_range(view, day)
+    return render_template(
+        'calendar.html',
+        entries=calendar_entries(start, end, lawyer or None),
+        view=view, day=day, start=start, end=end, prev_day=prev_day, next_day=next_day,
+        lawyer=lawyer, lawyers=calendar_lawyers(),
+    )
+
+
+def _ics_text(value):
+    return (str(value or '').replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ics_fold(line):
+    """Split a content line into 75-octet pieces (RFC 5545 section 3.1)."""
+    data = line.encode('utf-8')
+    pieces, limit = [], 75
+    while len(data) > limit:
+        cut = limit
+        while data[cut] & 0xC0 == 0x80:  # never split a UTF-8 sequence
+            cut -= 1
+        pieces.append(data[:cut])
+        data, limit = data[cut:], 74
+    pieces.append(data)
+    return '\r\n '.join(p.decode('utf-8') for p in pieces)
+
+
+def render_calendar_feed(entries, name):
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    host = request.host.split(':')[0]
+    lines = [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Law Office CMS//Hearings//EN',
+        'CALSCALE:GREGORIAN', 'METHOD:PUBLISH', f'X-WR-CALNAME:{_ics_text(name)}',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT1H',
+    ]
+    for e in entries:
+        summary = f"{e['case_number']} {e['client_name'] or ''}".strip()
+        if e['stage']:
+            summary += f" ({e['stage']})"
+        details = [f"Client: {e['client_name'] or '-'}", f"Opponent: {e['opponent_name'] or '-'}",
+                   f"Lawyer: {e['lawyer_name'] or '-'}"]
+        if not e['stage']:
+            details.append('Next date set at the previous hearing')
+        description = '\n'.join(details)
+        lines += [
+            'BEGIN:VEVENT',
+            f"UID:{e['uid']}@{host}",
+            f'DTSTAMP:{stamp}',
+            f"DTSTART;VALUE=DATE:{e['on']:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{e['on'] + timedelta(days=1):%Y%m%d}",
+            f'SUMMARY:{_ics_text(summary)}',
+            f"LOCATION:{_ics_text(e['court_name'])}",
+            f'DESCRIPTION:{_ics_text(description)}',
+            f"URL:{url_for('cases.case_details', case_id=e['case_id'], _external=True)}",
+            'TRANSP:TRANSPARENT',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ''.join(_ics_fold(line) + '\r\n' for line in lines)
+
+
+@bp.route('/calendar.ics')
+@conditional_get('cases', 'hearings')
+def calendar_feed():
+    """Subscription feed (?lawyer=), cached per lawyer and window until hearings change."""
+    lawyer = request.args.get('lawyer', '').strip()
+    today = datetime.today().date()
+    start = today - timedelta(days=current_app.config['CALENDAR_FEED_PAST_DAYS'])
+    end = today + timedelta(days=current_app.config['CALENDAR_FEED_DAYS'])
+    body = cached_fragment(
+        'calendar_feed', ['cases', 'hearings'],
+        lambda: render_calendar_feed(calendar_entries(start, end, lawyer or None),
+                                     f"Hearings – {lawyer}" if lawyer else 'Hearings'),
+        lawyer, start, end, request.host_url,
+    )
+    return current_app.response_class(str(body), mimetype='text/calendar',
+                              headers={'Content-Disposition': 'inline; filename="hearings.ics"'})
+
+
+@bp.cli.command('hearing-summary')
+@click.option('--rebuild', is_flag=True, help='Recompute the columns for every case.')
+def hearing_summary_command(rebuild):
+    """Verify (or rebuild) the next/last hearing date and hearing count on each case."""
+    if rebuild:
+        click.echo(f"Rebuilt hearing summary for {rebuild_hearing_summary()} cases")
+        return
+    stale = stale_hearing_summaries()
+    if stale:
+        shown = ', '.join(str(case_id) for case_id in stale[:20])
+        raise click.ClickException(f'{len(stale)} cases are out of date (ids {shown}'
+                                   f'{", ..." if len(stale) > 20 else ""}); run with --rebuild')
+    click.echo('Hearing summary OK')
@@ -0,0 +1,14 @@
+"""Template filters, also used when composing emails."""
+from datetime import datetime
+
+
+def format_date(value):
+    """Convert a date or datetime to dd:mm:yyyy format for templates."""
+    if not value:
+        return "-"
+    if isinstance(value, datetime):
+        return value.strftime("%d-%m-%Y")
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").strftime("%d-%m-%Y")
+    except Exception:
+        return str(value)
@@ -0,0 +1,234 @@
+"""Bulk import of cases and hearings from XLSX/CSV registers."""
+import csv
+import io
+from datetime import datetime
+
+from .extensions import db
+from .models import CASE_STATUSES, Case, Hearing
+from .search import reindex_cases
+from .summaries import (_add_fee_delta, adjust_fee_summary, adjust_status_counts, fee_summary_key,
+                        refresh_hearing_summary)
+
+# -----------------------
+# Bulk import
+# -----------------------
+IMPORT_CHUNK_ROWS = 1000
+
+# Accepted column headings (case-insensitive) -> field. The export headings
+# are included so an exported file can be imported elsewhere.
+IMPORT_COLUMNS = {
+    'case no': 'case_number', 'case number': 'case_number',
+    'client': 'client_name', 'client name': 'client_name',
+    'email': 'client_email', 'client email': 'client_email',
+    'mobile': 'client_mobile', 'client mobile': 'client_mobile',
+    'address': 'client_address', 'client address': 'client_address',
+    'opponent': 'opponent_name', 'opponent name': 'opponent_name',
+    'lawyer': 'lawyer_name', 'lawyer name': 'lawyer_name',
+    'court': 'court_name', 'court name': 'court_name',
+    'case type': 'case_type', 'police station': 'police_station',
+    'location': 'location', 'filing date': 'filing_date', 'status': 'status',
+    'description': 'description', 'total fees': 'total_fees', 'fees paid': 'fees_paid',
+    'notify client': 'notify_client',
+    'hearing date': 'hearing_date', 'stage': 'stage', 'notes': 'notes',
+    'next hearing': 'next_hearing_date', 'next hearing date': 'next_hearing_date',
+    'updated status': 'updated_status',
+}
+CASE_TEXT_FIELDS = ('lawyer_name', 'client_name', 'client_email', 'client_mobile',
+                    'client_address', 'opponent_name', 'court_name', 'case_type',
+                    'police_station', 'location', 'description')
+
+
+class ImportReport:
+    """Outcome of an import: counts plus (row number, case number, message) errors."""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.cases = 0
+        self.hearings = 0
+        self.errors = []
+
+
+def _import_date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if hasattr(value, 'year'):
+        return value
+    for fmt in ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"unrecognised date '{value}'")
+
+
+def _import_text(value):
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def read_sheet_rows(stream, filename):
+    """Yield rows (lists of cell values) from an XLSX or CSV upload, header first."""
+    if filename.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+        wb = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            for row in wb.active.iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            wb.close()
+    elif filename.lower().endswith('.csv'):
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        yield from csv.reader(text)
+    else:
+        raise ValueError('Upload an .xlsx or .csv file')
+
+
+def _parse_import_case(record, case_number):
+    """Validate the case columns of a row; returns the Case insert values."""
+    case = {'case_number': case_number}
+    for field in CASE_TEXT_FIELDS:
+        case[field] = _import_text(record.get(field))
+    if not case['client_name']:
+        raise ValueError('client name is required')
+
+    status = _import_text(record.get('status')) or 'Filed'
+    canonical = {s.lower(): s for s in CASE_STATUSES}
+    if status.lower() not in canonical:
+        raise ValueError(f"unknown status '{status}'")
+    case['status'] = canonical[status.lower()]
+    case['filing_date'] = _import_date(record.get('filing_date'))
+    try:
+        case['total_fees'] = float(record.get('total_fees') or 0)
+        case['fees_paid'] = float(record.get('fees_paid') or 0)
+    except (TypeError, ValueError):
+        raise ValueError('fees must be numbers')
+    case['fees_pending'] = case['total_fees'] - case['fees_paid']
+    case['notify_client'] = str(record.get('notify_client') or '').strip().lower() in (
+        '1', 'y', 'yes', 'true', 'on')
+    return case
+
+
+def _parse_import_hearing(record):
+    """Hearing insert values from a row, or None if it has no hearing columns."""
+    if not any(_import_text(record.get(f)) for f in ('hearing_date', 'stage', 'notes')):
+        return None
+    return {
+        'hearing_date': _import_date(record.get('hearing_date')),
+        'next_hearing_date': _import_date(record.get('next_hearing_date')),
+        'stage': _import_text(record.get('stage')),
+        'notes': _import_text(record.get('notes')),
+        'updated_status': _import_text(record.get('updated_status')),
+    }
+
+
+def _import_chunk(chunk, report, seen):
+    """Validate and insert one chunk of (row number, record) in one transaction."""
+    numbers = {_import_text(record.get('case_number')) for _, record in chunk} - {None}
+    # One set-based lookup for every case number in the chunk
+    existing = set(db.session.execute(
+        db.select(Case.case_number).where(Case.case_number.in_(numbers))
+    ).scalars()) if numbers else set()
+
+    new_cases, hearings = {}, []
+    for row_number, record in chunk:
+        number = _import_text(record.get('case_number'))
+        try:
+            if not number:
+                raise ValueError('case number is required')
+            if number in existing and number not in seen:
+                raise ValueError('case number already exists')
+            hearing = _parse_import_hearing(record)
+            if number in seen:
+                # A repeated case number only contributes another hearing
+                if hearing is None:
+                    raise ValueError('duplicate case number in file')
+            else:
+                new_cases[number] = _parse_import_case(record, number)
+                seen.add(number)
+        except ValueError as e:
+            report.errors.append((row_number, number, str(e)))
+            continue
+        if hearing:
+            hearings.append((row_number, number, hearing))
+
+    # Hearings for a case first seen in an earlier chunk need its id
+    earlier = {n for _, n, _ in hearings if n not in new_cases}
+    if report.dry_run:
+        report.cases += len(new_cases)
+        report.hearings += len(hearings)
+        return
+
+    try:
+        ids = {}
+        if new_cases:
+            result = db.session.execute(
+                db.insert(Case).returning(Case.id, Case.case_number), list(new_cases.values()))
+            ids.update((number, case_id) for case_id, number in result)
+        if earlier:
+            ids.update((number, case_id) for case_id, number in db.session.execute(
+                db.select(Case.id, Case.case_number).where(Case.case_number.in_(earlier))))
+        hearing_rows = []
+        for row_number, number, hearing in hearings:
+            if number in ids:
+                hearing_rows.append(dict(hearing, case_id=ids[number]))
+            else:  # its case was in a chunk that was rolled back
+                report.errors.append((row_number, number, 'case was not imported'))
+        if hearing_rows:
+            db.session.execute(db.insert(Hearing), hearing_rows)
+
+        # Bulk inserts skip the ORM flush hooks; maintain the side tables here
+        conn = db.session.connection()
+        refresh_hearing_summary(conn, {row['case_id'] for row in hearing_rows})
+        reindex_cases(conn, [ids[n] for n in new_cases])
+        deltas = {}
+        for case in new_cases.values():
+            deltas[case['status']] = deltas.get(case['status'], 0) + 1
+        adjust_status_counts(conn, deltas)
+        fees = {}
+        for case in new_cases.values():
+            _add_fee_delta(fees, fee_summary_key(case), 1, case)
+        adjust_fee_summary(conn, fees)
+        db.session.commit()
+        report.cases += len(new_cases)
+        report.hearings += len(hearing_rows)
+    except db.exc.IntegrityError as e:
+        db.session.rollback()
+        for row_number, record in chunk:
+            report.errors.append((row_number, record.get('case_number'), f'chunk rolled back: {e.orig}'))
+
+
+def import_cases(rows, dry_run=False):
+    """Import cases (and optional hearings) from an iterable of sheet rows.
+
+    The first row holds column headings (see IMPORT_COLUMNS). A row whose
+    case number repeats an earlier row adds another hearing to that case.
+    Rows are validated and inserted IMPORT_CHUNK_ROWS at a time, one
+    transaction per chunk. With dry_run nothing is written.
+    """
+    report = ImportReport(dry_run)
+    rows = iter(rows)
+    header = next(rows, None)
+    if not header:
+        report.errors.append((1, None, 'file is empty'))
+        return report
+    columns = [IMPORT_COLUMNS.get(str(h or '').strip().lower().replace('_', ' ')) for h in header]
+    if 'case_number' not in columns:
+        report.errors.append((1, None, 'no "Case No" column'))
+        return report
+
+    seen, chunk = set(), []
+    for row_number, values in enumerate(rows, 2):
+        if not any(v not in (None, '') for v in values):
+            continue
+        report.rows += 1
+        chunk.append((row_number, {f: v for f, v in zip(columns, values) if f}))
+        if len(chunk) >= IMPORT_CHUNK_ROWS:
+            _import_chunk(chunk, report, seen)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, report, seen)
+    return report
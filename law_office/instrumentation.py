@@ -0,0 +1,238 @@
+"""Request, SQL, template and SMTP metrics in the Prometheus text format."""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, current_app, g, has_app_context, has_request_context
+from flask import request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .extensions import log
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus model."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, buckets
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def lines(self, series):
+        for values, data in sorted(series.items()):
+            base = ','.join(f'{k}="{v}"' for k, v in zip(self.labels, values))
+            sep = ',' if base else ''
+            for bound, n in zip(self.buckets, data):
+                yield f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {n}'
+            yield f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {data[-1]}'
+            yield f'{self.name}_sum{{{base}}} {data[-2]:.6f}'
+            yield f'{self.name}_count{{{base}}} {data[-1]}'
+
+
+class Counter(Histogram):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels):
+        super().__init__(name, help_text, labels, buckets=())
+
+    def inc(self, *label_values):
+        self.observe(0, *label_values)
+
+    def lines(self, series):
+        for values, data in sorted(series.items()):
+            base = ','.join(f'{k}="{v}"' for k, v in zip(self.labels, values))
+            yield f'{self.name}{{{base}}} {data[-1]}'
+
+
+METRICS = [
+    Histogram('http_request_duration_seconds', 'Wall time per request.',
+              ('endpoint', 'method', 'status')),
+    Histogram('http_request_sql_statements', 'SQL statements per request.',
+              ('endpoint',), COUNT_BUCKETS),
+    Histogram('http_request_sql_seconds', 'Total SQL time per request.', ('endpoint',)),
+    Histogram('template_render_seconds', 'Jinja render time.', ('template',)),
+    Histogram('smtp_seconds', 'SMTP connect/login and send time.', ('operation',)),
+    Counter('sql_slow_statements_total', 'Statements slower than SLOW_QUERY_MS.', ('endpoint',)),
+    Counter('cache_requests_total', 'Fragment cache lookups.', ('fragment', 'result')),
+]
+metrics = {m.name: m for m in METRICS}
+
+
+def _endpoint():
+    return (request.endpoint or 'unknown') if has_request_context() else 'background'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _sql_timer_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _sql_timer_stop(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_app_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+    if has_app_context() and elapsed * 1000 >= current_app.config['SLOW_QUERY_MS']:
+        endpoint = _endpoint()
+        metrics['sql_slow_statements_total'].inc(endpoint)
+        log.warning("slow_query ms=%.1f endpoint=%s sql=%s",
+                    elapsed * 1000, endpoint, ' '.join(statement.split())[:500])
+
+
+@event.listens_for(Engine, 'handle_error')
+def _sql_timer_discard(context):
+    starts = context.connection.info.get('query_start') if context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+
+
+def _record_request_metrics(response):
+    if 'request_start' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = _endpoint()
+    metrics['http_request_duration_seconds'].observe(
+        elapsed, endpoint, request.method, response.status_code)
+    metrics['http_request_sql_statements'].observe(g.sql_count, endpoint)
+    metrics['http_request_sql_seconds'].observe(g.sql_seconds, endpoint)
+    log.info("request method=%s path=%s endpoint=%s status=%s ms=%.1f sql=%d sql_ms=%.1f",
+             request.method, request.path, endpoint, response.status_code,
+             elapsed * 1000, g.sql_count, g.sql_seconds * 1000)
+    _write_metrics_snapshot()
+    return response
+
+
+def _template_timer_start(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+
+def _template_timer_stop(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        metrics['template_render_seconds'].observe(
+            time.perf_counter() - starts.pop(), template.name or 'string')
+
+
+@contextmanager
+def timed_smtp(operation):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics['smtp_seconds'].observe(time.perf_counter() - start, operation)
+
+
+def _metrics_series():
+    return {m.name: {json.dumps(k): list(v) for k, v in m.series.items()} for m in METRICS}
+
+
+_last_snapshot = 0.0
+
+
+def _write_metrics_snapshot(force=False):
+    """Persist this process's metrics to METRICS_DIR at most every few seconds."""
+    global _last_snapshot
+    directory = current_app.config['METRICS_DIR']
+    if not directory or (not force and time.monotonic() - _last_snapshot < 5):
+        return
+    _last_snapshot = time.monotonic()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(_metrics_series(), f)
+    os.replace(path + '.tmp', path)
+
+
+def remove_metrics_snapshot(directory, pid):
+    """Delete the METRICS_DIR file of a process that has exited."""
+    if directory:
+        try:
+            os.remove(os.path.join(directory, f'{pid}.json'))
+        except FileNotFoundError:
+            pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect_metrics():
+    """Merged {metric name: {label values: data}} across live processes.
+
+    Files left by processes that no longer exist (a worker killed before
+    gunicorn's worker_exit hook ran) are deleted rather than summed in.
+    METRICS_DIR must therefore be local to the host.
+    """
+    if not current_app.config['METRICS_DIR']:
+        return {m.name: dict(m.series) for m in METRICS}
+    _write_metrics_snapshot(force=True)
+    merged = {m.name: {} for m in METRICS}
+    for entry in os.scandir(current_app.config['METRICS_DIR']):
+        if not entry.name.endswith('.json'):
+            continue
+        pid = entry.name[:-len('.json')]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            remove_metrics_snapshot(current_app.config['METRICS_DIR'], pid)
+            continue
+        try:
+            with open(entry.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, series in snapshot.items():
+            for key, data in series.items():
+                values = tuple(json.loads(key))
+                into = merged.setdefault(name, {}).setdefault(values, [0] * len(data))
+                for i, v in enumerate(data):
+                    into[i] += v
+    return merged
+
+
+def metrics_view():
+    """Prometheus text exposition of the request, SQL, template and SMTP metrics."""
+    merged = collect_metrics()
+    out = []
+    for m in METRICS:
+        out.append(f'# HELP {m.name} {m.help}')
+        out.append(f'# TYPE {m.name} {m.kind}')
+        out.extend(m.lines(merged.get(m.name, {})))
+    return '\n'.join(out) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+def init_app(app):
+    app.before_request(_start_request_metrics)
+    app.after_request(_record_request_metrics)
+    before_render_template.connect(_template_timer_start, app)
+    template_rendered.connect(_template_timer_stop, app)
+    app.add_url_rule('/metrics', 'metrics_view', metrics_view)
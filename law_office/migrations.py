@@ -0,0 +1,138 @@
+"""Table creation and numbered schema migrations."""
+import os
+import threading
+
+from flask import current_app
+from sqlalchemy.schema import CreateColumn
+
+from .extensions import db
+from .models import Case, EmailOutbox, Hearing, Notification, SchemaVersion, Settings
+from .search import init_search_index
+from .summaries import HEARING_SUMMARY_FIELDS, init_fee_summary, init_status_counts, refresh_hearing_summary
+
+# -----------------------
+# Schema migrations
+# -----------------------
+# db.create_all() only creates missing tables. Changes to existing tables
+# (new columns, new indexes) are numbered migrations applied in order and
+# recorded in schema_version. Every migration must be safe to re-run.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def add_columns(conn, model, *names):
+    """ALTER TABLE ... ADD COLUMN for each named column the table lacks."""
+    table = model.__table__
+    existing = {c['name'] for c in db.inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            ddl = CreateColumn(table.c[name]).compile(dialect=conn.dialect)
+            conn.execute(db.text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+
+
+def create_indexes(conn, model, *names):
+    """Create the named indexes declared on the model if they are missing."""
+    for index in model.__table__.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+@migration(1, 'Notification delivery state')
+def _migrate_notification_status(conn):
+    add_columns(conn, Notification, 'status', 'error')
+
+
+@migration(2, 'Indexes for dashboard, hearing and notification queries')
+def _migrate_hot_query_indexes(conn):
+    create_indexes(conn, Case, 'ix_case_status_id', 'ix_case_client_name')
+    create_indexes(conn, Hearing, 'ix_hearing_case_id_hearing_date', 'ix_hearing_hearing_date')
+    create_indexes(conn, Notification, 'ix_notification_case_id_sent_at')
+
+
+@migration(3, 'Index next hearing dates for reminders')
+def _migrate_next_hearing_index(conn):
+    create_indexes(conn, Hearing, 'ix_hearing_next_hearing_date')
+
+
+@migration(4, 'Link notifications to bulk notices')
+def _migrate_notification_bulk(conn):
+    add_columns(conn, Notification, 'bulk_id')
+    create_indexes(conn, Notification, 'ix_notification_bulk_id_status')
+    create_indexes(conn, EmailOutbox, 'ix_email_outbox_notification_id')
+
+
+@migration(5, 'Hearing summary columns on case')
+def _migrate_case_hearing_summary(conn):
+    add_columns(conn, Case, *HEARING_SUMMARY_FIELDS)
+    create_indexes(conn, Case, 'ix_case_latest_listed_date_status', 'ix_case_last_hearing_date_status')
+    refresh_hearing_summary(conn)
+
+
+def schema_version():
+    row = db.session.get(SchemaVersion, 1)
+    return row.version if row else 0
+
+
+def upgrade_db():
+    """Apply pending migrations, each in its own transaction. Returns those applied."""
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        with db.engine.begin() as conn:
+            current = conn.execute(
+                db.select(SchemaVersion.version).where(SchemaVersion.id == 1)
+            ).scalar()
+            if current is None:
+                conn.execute(db.insert(SchemaVersion).values(id=1, version=0))
+                current = 0
+            if version <= current:
+                continue
+            fn(conn)
+            conn.execute(
+                db.update(SchemaVersion).where(SchemaVersion.id == 1).values(version=version)
+            )
+        applied.append((version, description))
+    return applied
+
+
+def init_db():
+    """Create missing tables, apply migrations and fill the derived tables.
+
+    Runs in a fresh app context of the current app, so its commits never
+    touch the caller's session.
+    """
+    with current_app.app_context():
+        db.create_all()
+        upgrade_db()
+        init_search_index()
+        init_status_counts()
+        init_fee_summary()
+        # Create default settings if none
+        if Settings.query.first() is None:
+            s = Settings(
+                lawyer_name='Your Name',
+                lawyer_email=os.getenv('EMAIL_USER', ''),
+                email_password=os.getenv('EMAIL_PASS', ''),
+                email_notifications_enabled=False
+            )
+            db.session.add(s)
+            db.session.commit()
+
+_db_ready = False
+_db_ready_lock = threading.Lock()
+
+def ensure_db():
+    """Bring the database schema up to date once per process (AUTO_MIGRATE)."""
+    global _db_ready
+    if _db_ready or not current_app.config['AUTO_MIGRATE']:
+        return
+    with _db_ready_lock:
+        if not _db_ready:
+            init_db()
+            _db_ready = True
@@ -0,0 +1,182 @@
+"""Database models."""
+from datetime import datetime
+
+from .extensions import db
+
+# -----------------------
+# Models
+# -----------------------
+class Case(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    case_number = db.Column(db.String(120), unique=True, nullable=False)
+    lawyer_name = db.Column(db.String(120))
+    client_name = db.Column(db.String(120))
+    client_email = db.Column(db.String(120))
+    client_mobile = db.Column(db.String(50))
+    client_address = db.Column(db.Text)
+    opponent_name = db.Column(db.String(120))
+    court_name = db.Column(db.String(120))
+    case_type = db.Column(db.String(120))
+    police_station = db.Column(db.String(120))
+    location = db.Column(db.String(200))
+    filing_date = db.Column(db.Date)
+    # active_history so the old status is known when counters are adjusted
+    status = db.column_property(db.Column(db.String(80)), active_history=True)
+    description = db.Column(db.Text)
+    total_fees = db.Column(db.Float, default=0.0)
+    fees_paid = db.Column(db.Float, default=0.0)
+    fees_pending = db.Column(db.Float, default=0.0)
+    notify_client = db.Column(db.Boolean, default=False)
+    # Mirrors of the case's hearings, maintained on flush (see refresh_hearing_summary)
+    latest_listed_date = db.Column(db.Date)
+    last_hearing_date = db.Column(db.Date)
+    hearing_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    hearings = db.relationship('Hearing', backref='case', cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_case_status_id', 'status', 'id'),  # status filter + keyset paging
+        db.Index('ix_case_client_name', 'client_name'),
+        # "Needs attention" counts are range scans over these, covered by status
+        db.Index('ix_case_latest_listed_date_status', 'latest_listed_date', 'status'),
+        db.Index('ix_case_last_hearing_date_status', 'last_hearing_date', 'status'),
+    )
+
+    def recalc_fees(self):
+        self.fees_pending = (self.total_fees or 0.0) - (self.fees_paid or 0.0)
+
+class Hearing(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.Integer, db.ForeignKey('case.id'), nullable=False)
+    hearing_date = db.Column(db.Date)
+    stage = db.Column(db.String(200))
+    notes = db.Column(db.Text)
+    next_hearing_date = db.Column(db.Date, nullable=True)
+    updated_status = db.Column(db.String(80))
+
+    __table_args__ = (
+        db.Index('ix_hearing_case_id_hearing_date', 'case_id', 'hearing_date'),
+        db.Index('ix_hearing_hearing_date', 'hearing_date'),
+        db.Index('ix_hearing_next_hearing_date', 'next_hearing_date'),
+    )
+
+class Notification(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.Integer, db.ForeignKey('case.id'))
+    email_to = db.Column(db.String(120))
+    subject = db.Column(db.String(200))
+    body = db.Column(db.Text)
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), default='sent')  # queued / sent / failed / cancelled
+    error = db.Column(db.Text)
+    bulk_id = db.Column(db.Integer, db.ForeignKey('bulk_notice.id'))
+    # Filled by history listings (with_expression) so they can defer the full body
+    body_preview = db.query_expression()
+
+    case = db.relationship('Case', backref=db.backref('notifications', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_notification_case_id_sent_at', 'case_id', 'sent_at'),
+        db.Index('ix_notification_bulk_id_status', 'bulk_id', 'status'),
+    )
+
+class NotificationArchive(db.Model):
+    """Notifications moved out of the live table: one case's rows as zlib-compressed JSON."""
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.Integer, db.ForeignKey('case.id'))
+    first_sent_at = db.Column(db.DateTime, nullable=False)
+    last_sent_at = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+    case = db.relationship('Case', backref=db.backref('notification_archives', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_notification_archive_case_id_last_sent_at', 'case_id', 'last_sent_at'),
+    )
+
+class BulkNotice(db.Model):
+    """One bulk email to the clients matching a filter; its notifications point here."""
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    criteria = db.Column(db.String(300))
+    subject = db.Column(db.String(200))
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+class EmailOutbox(db.Model):
+    """A queued delivery of a Notification; the row is removed once it is final."""
+    id = db.Column(db.Integer, primary_key=True)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notification.id'), nullable=False,
+                                index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+
+    notification = db.relationship('Notification')
+
+class SendQuota(db.Model):
+    """Token bucket shared by every process that sends email (OUTBOX_RATE_PER_MINUTE)."""
+    name = db.Column(db.String(50), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated = db.Column(db.Float, nullable=False)  # time.time() of the last refill
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class HearingReminder(db.Model):
+    """One row per reminder sent, so a case is reminded once per hearing date per day."""
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.Integer, db.ForeignKey('case.id'), nullable=False)
+    hearing_on = db.Column(db.Date, nullable=False)
+    sent_on = db.Column(db.Date, nullable=False)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notification.id'))
+
+    __table_args__ = (
+        db.UniqueConstraint('sent_on', 'case_id', 'hearing_on', name='uq_hearing_reminder'),
+    )
+
+class Settings(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    lawyer_name = db.Column(db.String(120))
+    lawyer_email = db.Column(db.String(120))
+    email_password = db.Column(db.String(255))
+    email_notifications_enabled = db.Column(db.Boolean, default=False)
+
+class CaseSearchTerm(db.Model):
+    """Token -> case postings used for search when FTS5 is not available."""
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(120), nullable=False)
+    case_id = db.Column(db.Integer, nullable=False, index=True)
+
+    __table_args__ = (db.Index('ix_case_search_term_term', 'term', 'case_id'),)
+
+class SchemaVersion(db.Model):
+    """Single row recording the last migration applied to this database."""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class CaseStatusCount(db.Model):
+    """Number of cases per status, kept current on every flush."""
+    status = db.Column(db.String(80), primary_key=True)  # '' for cases with no status
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class FeeSummary(db.Model):
+    """Case count and fees per lawyer/court/case type/filing month/status ('' for none)."""
+    id = db.Column(db.Integer, primary_key=True)
+    lawyer_name = db.Column(db.String(120), nullable=False, default='')
+    court_name = db.Column(db.String(120), nullable=False, default='')
+    case_type = db.Column(db.String(120), nullable=False, default='')
+    filing_month = db.Column(db.String(7), nullable=False, default='')  # YYYY-MM
+    status = db.Column(db.String(80), nullable=False, default='')
+    cases = db.Column(db.Integer, nullable=False, default=0)
+    total_fees = db.Column(db.Float, nullable=False, default=0.0)
+    fees_paid = db.Column(db.Float, nullable=False, default=0.0)
+    fees_pending = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('lawyer_name', 'court_name', 'case_type', 'filing_month', 'status',
+                            name='uq_fee_summary'),
+        db.Index('ix_fee_summary_filing_month_status', 'filing_month', 'status'),
+    )
+
+
+CASE_STATUSES = ['Filed', 'In Progress', 'Hearing', 'Judgment', 'Closed']
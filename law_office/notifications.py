@@ -0,0 +1,244 @@
+"""Notification history, resends, bulk notices and the outbox worker command."""
+import re
+import time
+from datetime import datetime
+
+import click
+from flask import Blueprint, Response, current_app, flash, redirect, render_template, request, url_for
+
+from .archive import archive_notifications
+from .extensions import db
+from .helpers import format_date
+from .models import (CASE_STATUSES, BulkNotice, Case, EmailOutbox, Hearing, Notification,
+                     NotificationArchive, Settings)
+from .outbox import drain_outbox, send_client_email, wake_outbox_worker
+from .pagination import keyset_paginate
+from .search import typeahead_index
+
+bp = Blueprint('notifications', __name__, cli_group=None)
+
+
+# -----------------------
+# Notification history
+# -----------------------
+@bp.cli.command('archive-notifications')
+@click.option('--days', type=int, default=None,
+              help='Archive notifications older than this (default NOTIFICATION_RETENTION_DAYS).')
+def archive_notifications_command(days):
+    """Move old sent/failed notifications into the compressed archive table."""
+    start = time.perf_counter()
+    moved = archive_notifications(days)
+    click.echo(f"{moved} notifications archived in {time.perf_counter() - start:.1f}s")
+
+
+@bp.route('/case/<int:case_id>/notifications')
+def case_notifications(case_id):
+    """One page of the case's live notifications; bodies load on demand."""
+    # The archive summary rides along with the case lookup as scalar subqueries
+    archive = db.select(NotificationArchive).where(NotificationArchive.case_id == Case.id)
+    case, *archived = Case.query.add_columns(
+        archive.with_only_columns(db.func.sum(NotificationArchive.count)).scalar_subquery(),
+        archive.with_only_columns(db.func.min(NotificationArchive.first_sent_at)).scalar_subquery(),
+        archive.with_only_columns(db.func.max(NotificationArchive.last_sent_at)).scalar_subquery(),
+    ).filter(Case.id == case_id).first_or_404()
+    query = Notification.query.filter_by(case_id=case_id).options(
+        db.defer(Notification.body),
+        db.with_expression(Notification.body_preview, db.func.substr(Notification.body, 1, 81)),
+    )
+    size = request.args.get('per_page', type=int) or current_app.config['NOTIFICATIONS_PAGE_SIZE']
+    page = keyset_paginate(
+        query, [(Notification.sent_at, True, datetime.fromisoformat), (Notification.id, True, int)],
+        max(1, min(size, current_app.config['CASES_MAX_PAGE_SIZE'])),
+        after=request.args.get('after'), before=request.args.get('before'),
+    )
+    return render_template('notifications.html', case=case, notes=page.items, page=page,
+                           archived=archived if page.next_cursor is None and archived[0] else None)
+
+
+@bp.route('/notification/<int:note_id>/body')
+def notification_body(note_id):
+    """The full text of one notification, for the history page."""
+    note = Notification.query.get_or_404(note_id)
+    return Response(note.body or '', mimetype='text/plain')
+
+
+@bp.route('/notification/<int:note_id>/resend')
+def resend_notification(note_id):
+    note = Notification.query.get_or_404(note_id)
+    case = note.case
+    # Queue a fresh copy through the outbox; the original entry keeps its state
+    if send_client_email(case, note.subject, note.body):
+        flash(f"Email queued for {case.client_email}", "success")
+    else:
+        flash("Email not queued: notifications are disabled or the client has no email", "danger")
+    return redirect(url_for('notifications.case_notifications', case_id=case.id))
+
+# -----------------------
+# Bulk notices
+# -----------------------
+BULK_PLACEHOLDERS = ('client_name', 'case_number', 'court_name', 'lawyer_name',
+                     'opponent_name', 'case_type', 'status', 'date')
+
+
+_PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+
+def render_notice(template, values):
+    """Fill {placeholders} from values; unknown ones and stray braces are left as typed."""
+    return _PLACEHOLDER_RE.sub(lambda m: str(values.get(m.group(1), m.group(0))), template)
+
+
+def bulk_targets(court=None, on=None, status=None, case_type=None):
+    """Cases to notify, selected in one query with only the columns a message uses.
+
+    `on` keeps cases with a hearing, or a next hearing date, on that day.
+    Cases without an email address or with notifications off are skipped.
+    """
+    stmt = db.select(
+        Case.id, Case.case_number, Case.client_name, Case.client_email, Case.court_name,
+        Case.lawyer_name, Case.opponent_name, Case.case_type, Case.status,
+    ).where(Case.notify_client.is_(True), Case.client_email.isnot(None), Case.client_email != '')
+    if court:
+        stmt = stmt.where(Case.court_name == court)
+    if status:
+        stmt = stmt.where(Case.status == status)
+    if case_type:
+        stmt = stmt.where(Case.case_type == case_type)
+    if on:
+        stmt = stmt.where(Case.id.in_(db.select(Hearing.case_id).where(
+            db.or_(Hearing.hearing_date == on, Hearing.next_hearing_date == on))))
+    return db.session.execute(stmt.order_by(Case.id)).all()
+
+
+def bulk_messages(targets, subject, body, on=None):
+    """(target, subject, body) with each case's values filled in."""
+    for t in targets:
+        values = {name: getattr(t, name, None) or '' for name in BULK_PLACEHOLDERS}
+        values['date'] = format_date(on) if on else ''
+        yield t, render_notice(subject, values), render_notice(body, values)
+
+
+def queue_bulk_notice(criteria, targets, subject, body, on=None):
+    """Write a BulkNotice with one queued Notification and outbox row per target.
+
+    All notifications go in with one bulk insert; the outbox worker sends
+    them over OUTBOX_CONCURRENCY sessions at OUTBOX_RATE_PER_MINUTE.
+    """
+    now = datetime.utcnow()
+    notice = BulkNotice(criteria=criteria, subject=subject, total=len(targets))
+    db.session.add(notice)
+    db.session.flush()
+    notes = [dict(case_id=t.id, email_to=t.client_email, subject=subj, body=text,
+                  sent_at=now, status='queued', bulk_id=notice.id)
+             for t, subj, text in bulk_messages(targets, subject, body, on)]
+    if notes:
+        note_ids = db.session.execute(
+            db.insert(Notification).returning(Notification.id, sort_by_parameter_order=True), notes
+        ).scalars().all()
+        db.session.execute(db.insert(EmailOutbox), [
+            dict(notification_id=nid, attempts=0, next_attempt_at=now) for nid in note_ids])
+    db.session.commit()
+    wake_outbox_worker()
+    return notice
+
+
+def bulk_progress(notice):
+    """{'total', 'queued', 'sent', 'failed', 'cancelled', 'retrying'} for a bulk notice."""
+    counts = dict(db.session.execute(
+        db.select(Notification.status, db.func.count())
+        .where(Notification.bulk_id == notice.id).group_by(Notification.status)
+    ).all())
+    retrying = db.session.execute(
+        db.select(db.func.count()).select_from(EmailOutbox)
+        .join(Notification, EmailOutbox.notification_id == Notification.id)
+        .where(Notification.bulk_id == notice.id, Notification.status == 'queued',
+               EmailOutbox.attempts > 0)
+    ).scalar()
+    return {'total': notice.total, 'queued': counts.get('queued', 0),
+            'sent': counts.get('sent', 0), 'failed': counts.get('failed', 0),
+            'cancelled': counts.get('cancelled', 0), 'retrying': retrying}
+
+
+def _bulk_form():
+    form = request.values
+    on = None
+    if form.get('on'):
+        try:
+            on = datetime.strptime(form['on'], '%Y-%m-%d').date()
+        except ValueError:
+            on = None
+    filters = {
+        'court': form.get('court', '').strip() or None,
+        'on': on,
+        'status': form.get('status', '').strip() or None,
+        'case_type': form.get('case_type', '').strip() or None,
+    }
+    return filters, form.get('subject', '').strip(), form.get('body', '').strip()
+
+
+def _bulk_criteria(filters):
+    parts = [f"{label}: {format_date(filters[key]) if key == 'on' else filters[key]}"
+             for key, label in (('court', 'Court'), ('on', 'Hearing on'),
+                                ('status', 'Status'), ('case_type', 'Case type'))
+             if filters[key]]
+    return ', '.join(parts) or 'All cases'
+
+
+@bp.route('/notify', methods=['GET', 'POST'])
+def bulk_notify():
+    """Email every client matching a court/date/status/case type filter."""
+    filters, subject, body = _bulk_form()
+    preview = targets = None
+    if request.method == 'POST':
+        if not subject or not body:
+            flash('Subject and message are required', 'danger')
+        else:
+            targets = bulk_targets(**filters)
+            if request.form.get('action') == 'send':
+                settings = Settings.query.first()
+                if not settings or not settings.email_notifications_enabled:
+                    flash('Email notifications are disabled in Settings', 'danger')
+                elif not targets:
+                    flash('No clients match these filters', 'warning')
+                else:
+                    notice = queue_bulk_notice(_bulk_criteria(filters), targets, subject, body,
+                                               filters['on'])
+                    flash(f'{notice.total} emails queued', 'success')
+                    return redirect(url_for('notifications.bulk_notify_status', bulk_id=notice.id))
+            preview = list(bulk_messages(targets[:5], subject, body, filters['on']))
+    return render_template(
+        'bulk_notify.html', filters=filters, subject=subject, body=body,
+        targets=targets, preview=preview, placeholders=BULK_PLACEHOLDERS,
+        courts=typeahead_index('court_name').values(), case_types=typeahead_index('case_type').values(),
+        statuses=CASE_STATUSES,
+        recent=BulkNotice.query.order_by(BulkNotice.id.desc()).limit(10).all(),
+    )
+
+
+@bp.route('/notify/<int:bulk_id>')
+def bulk_notify_status(bulk_id):
+    notice = BulkNotice.query.get_or_404(bulk_id)
+    return render_template('bulk_notify_status.html', notice=notice,
+                           progress=bulk_progress(notice))
+
+
+@bp.route('/notify/<int:bulk_id>/progress')
+def bulk_notify_progress(bulk_id):
+    """JSON counts polled by the status page."""
+    return bulk_progress(BulkNotice.query.get_or_404(bulk_id))
+
+# -----------------------
+# Email outbox
+# -----------------------
+@bp.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Drain what is due and exit.')
+@click.option('--interval', type=float, default=None, help='Seconds between polls.')
+def outbox_worker_command(once, interval):
+    """Deliver queued client emails (run alongside web with OUTBOX_WORKER=off)."""
+    interval = interval or current_app.config['OUTBOX_POLL_SECONDS']
+    while True:
+        sent, failed = drain_outbox()
+        if once:
+            click.echo(f"{sent} sent, {failed} failed")
+            return
+        time.sleep(interval)
@@ -0,0 +1,361 @@
+"""Queued client email, delivered by a background worker under a shared rate limit."""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .extensions import db, log
+from .instrumentation import timed_smtp
+from .models import EmailOutbox, Notification, SendQuota, Settings
+
+
+# -----------------------
+# Email outbox
+# -----------------------
+def smtp_connect(user, password):
+    """Open an SMTP session to the configured host, ready to send."""
+    from smtplib import SMTP
+    with timed_smtp('connect'):
+        server = SMTP(current_app.config['SMTP_HOST'], current_app.config['SMTP_PORT'],
+                      timeout=current_app.config['SMTP_TIMEOUT'])
+        try:
+            if current_app.config['SMTP_USE_TLS']:
+                server.starttls()
+            if current_app.config['SMTP_AUTH'] and password:
+                server.login(user, password)
+        except Exception:
+            server.close()
+            raise
+    return server
+
+
+def send_test_email(user, password):
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    msg = MIMEMultipart()
+    msg['From'] = user
+    msg['To'] = user
+    msg['Subject'] = "Test Email - LOCMS"
+    msg.attach(MIMEText("This is a test email from your Law Office Case Management System.", 'plain'))
+
+    with smtp_connect(user, password) as server, timed_smtp('send'):
+        server.send_message(msg)
+
+
+def build_client_message(settings, note):
+    """Plain + HTML MIME message for a logged notification."""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    html_body = f"""
+    <html>
+      <body style="font-family:Arial, sans-serif; line-height:1.6;">
+        <h3 style="color:#2c3e50;">{note.subject}</h3>
+        <p>{(note.body or '').replace(chr(10), '<br>')}</p>
+        <hr>
+        <p style="font-size:0.9em;color:#888;">
+          Sent by {settings.lawyer_name} – Law Office Case Management System
+        </p>
+      </body>
+    </html>
+    """
+    msg = MIMEMultipart("alternative")
+    msg["From"] = settings.lawyer_email
+    msg["To"] = note.email_to
+    msg["Subject"] = note.subject
+    msg.attach(MIMEText(note.body or '', "plain"))
+    msg.attach(MIMEText(html_body, "html"))
+    return msg
+
+
+def send_client_email(case, subject, message_body):
+    """Queue an email to the client if all notification conditions are met.
+
+    The message is logged as a 'queued' Notification and handed to the
+    outbox worker; nothing talks to the SMTP server on the request path.
+    Returns the Notification, or None when nothing was queued.
+    """
+    settings = Settings.query.first()
+    if not settings:
+        log.warning("email skipped case=%s reason=no_settings", case.id)
+        return None
+
+    # Check global + case-level notification switches
+    if not settings.email_notifications_enabled or not getattr(case, "notify_client", True):
+        log.info("email skipped case=%s reason=notifications_disabled", case.id)
+        return None
+
+    receiver = case.client_email
+    if not receiver:
+        log.info("email skipped case=%s reason=no_client_email", case.id)
+        return None
+
+    note = Notification(
+        case_id=case.id,
+        email_to=receiver,
+        subject=subject,
+        body=message_body,
+        sent_at=datetime.utcnow(),
+        status='queued',
+    )
+    db.session.add(note)
+    db.session.add(EmailOutbox(notification=note))
+    db.session.commit()
+    wake_outbox_worker()
+    return note
+
+
+def _claim_outbox_batch(batch_size):
+    """Lock up to batch_size due entries for this worker and return their ids.
+
+    One send token is taken per entry before it is locked (waiting for the
+    shared rate limit if need be), so a claimed batch sends without pausing.
+    """
+    now = datetime.utcnow()
+    ids = [row.id for row in db.session.query(EmailOutbox.id).filter(
+        EmailOutbox.next_attempt_at <= now,
+        db.or_(EmailOutbox.locked_until.is_(None), EmailOutbox.locked_until < now),
+    ).order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(batch_size)]
+    db.session.commit()
+    if not ids:
+        return []
+    ids = ids[:send_limiter().take(len(ids))]
+    now = datetime.utcnow()
+    seconds = max(current_app.config['SMTP_TIMEOUT'] * len(ids), 300)
+    lease = now + timedelta(seconds=seconds, microseconds=random.randrange(1000000))
+    db.session.query(EmailOutbox).filter(
+        EmailOutbox.id.in_(ids),
+        db.or_(EmailOutbox.locked_until.is_(None), EmailOutbox.locked_until < now),
+    ).update({EmailOutbox.locked_until: lease}, synchronize_session=False)
+    db.session.commit()
+    # Another worker may have claimed some of the rows between the two statements
+    claimed = [row.id for row in db.session.query(EmailOutbox.id).filter(
+        EmailOutbox.id.in_(ids), EmailOutbox.locked_until == lease)]
+    send_limiter().refund(len(ids) - len(claimed))
+    return claimed
+
+
+def _record_failure(entry, error):
+    entry.attempts += 1
+    entry.last_error = str(error)
+    entry.locked_until = None
+    note = entry.notification
+    note.error = entry.last_error
+    if entry.attempts >= current_app.config['OUTBOX_MAX_ATTEMPTS']:
+        note.status = 'failed'
+        db.session.delete(entry)
+    else:
+        delay = min(current_app.config['OUTBOX_RETRY_SECONDS'] * 2 ** (entry.attempts - 1), 3600)
+        entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def _cancel_switched_off(entries, settings):
+    """Cancel claimed entries whose email was switched off after it was queued.
+
+    The global and per-case notification switches are checked again here,
+    so entries queued (or backing off) before an admin turned email off
+    are never sent. Returns the entries that may still be sent.
+    """
+    enabled = settings is not None and settings.email_notifications_enabled
+    keep = []
+    for entry in entries:
+        note = entry.notification
+        if enabled and (note.case is None or note.case.notify_client):
+            keep.append(entry)
+            continue
+        note.status = 'cancelled'
+        note.error = ('Email notifications were turned off' if not enabled
+                      else 'Client notifications were turned off for this case')
+        db.session.delete(entry)
+    if len(keep) < len(entries):
+        db.session.commit()
+        send_limiter().refund(len(entries) - len(keep))
+        log.info("outbox_cancelled count=%d", len(entries) - len(keep))
+    return keep
+
+
+def deliver_outbox(batch_size=None):
+    """Send one batch of due outbox entries over a single SMTP session.
+
+    Returns (sent, failed) counts for the batch; cancelled entries count
+    as neither.
+    """
+    ids = _claim_outbox_batch(batch_size or current_app.config['OUTBOX_BATCH_SIZE'])
+    if not ids:
+        return 0, 0
+    entries = (EmailOutbox.query
+               .options(db.joinedload(EmailOutbox.notification).joinedload(Notification.case))
+               .filter(EmailOutbox.id.in_(ids)).order_by(EmailOutbox.id).all())
+    settings = Settings.query.first()
+    entries = _cancel_switched_off(entries, settings)
+    if not entries:
+        return 0, 0
+    sent = failed = 0
+    try:
+        server = smtp_connect(settings.lawyer_email, settings.email_password)
+    except Exception as e:
+        log.error("smtp_connect_failed host=%s error=%s", current_app.config['SMTP_HOST'], e)
+        for entry in entries:
+            _record_failure(entry, e)
+        db.session.commit()
+        return 0, len(entries)
+
+    with server:
+        for entry in entries:
+            note = entry.notification
+            try:
+                with timed_smtp('send'):
+                    server.send_message(build_client_message(settings, note))
+            except Exception as e:
+                log.error("email_send_failed notification=%s to=%s error=%s",
+                          note.id, note.email_to, e)
+                _record_failure(entry, e)
+                failed += 1
+            else:
+                note.status = 'sent'
+                note.sent_at = datetime.utcnow()
+                note.error = None
+                db.session.delete(entry)
+                sent += 1
+            db.session.commit()
+    log.info("outbox_batch sent=%d failed=%d", sent, failed)
+    return sent, failed
+
+
+class RateLimiter:
+    """Token bucket allowing `per_minute` sends a minute across all processes (0 = no limit).
+
+    The bucket is a SendQuota row refilled from the wall clock, so web
+    workers, `flask outbox-worker` and `flask send-reminders` draw on one
+    limit. Updates are a compare-and-set on the row's version, retried when
+    another process got there first.
+    """
+
+    def __init__(self, per_minute, name='email'):
+        self.per_minute, self.name = per_minute, name
+
+    def _state(self):
+        """(tokens available now, version or None if there is no row yet, refill time)."""
+        now = time.time()
+        with db.engine.begin() as conn:
+            row = conn.execute(db.select(SendQuota.tokens, SendQuota.updated, SendQuota.version)
+                               .where(SendQuota.name == self.name)).first()
+        if row is None:
+            return float(self.per_minute), None, now
+        refill = max(0.0, now - row.updated) * self.per_minute / 60
+        return min(float(self.per_minute), row.tokens + refill), row.version, max(now, row.updated)
+
+    def _store(self, version, tokens, updated):
+        try:
+            with db.engine.begin() as conn:
+                if version is None:
+                    conn.execute(db.insert(SendQuota).values(
+                        name=self.name, tokens=tokens, updated=updated, version=0))
+                    return True
+                return conn.execute(
+                    db.update(SendQuota)
+                    .where(SendQuota.name == self.name, SendQuota.version == version)
+                    .values(tokens=tokens, updated=updated, version=version + 1)
+                ).rowcount == 1
+        except db.exc.IntegrityError:  # another process created the row first
+            return False
+
+    def take(self, wanted):
+        """Wait for at least one token, then take up to `wanted`. Returns how many were taken."""
+        if self.per_minute <= 0 or wanted <= 0:
+            return wanted
+        while True:
+            tokens, version, updated = self._state()
+            if tokens < 1:
+                time.sleep((1 - tokens) * 60 / self.per_minute)
+                continue
+            taken = min(wanted, int(tokens))
+            if self._store(version, tokens - taken, updated):
+                return taken
+
+    def refund(self, count):
+        """Return tokens taken for entries that were not sent after all."""
+        if self.per_minute <= 0 or count <= 0:
+            return
+        while True:
+            tokens, version, updated = self._state()
+            if self._store(version, min(float(self.per_minute), tokens + count), updated):
+                return
+
+
+def send_limiter():
+    limiter = current_app.extensions.get('send_limiter')
+    if limiter is None:
+        limiter = current_app.extensions['send_limiter'] = RateLimiter(
+            current_app.config['OUTBOX_RATE_PER_MINUTE'])
+    return limiter
+
+
+def _drain_batches(batch_size):
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = deliver_outbox(batch_size)
+        if not sent and not failed:
+            return total_sent, total_failed
+        total_sent += sent
+        total_failed += failed
+
+
+def _drain_in_thread(app, batch_size):
+    with app.app_context():
+        return _drain_batches(batch_size)
+
+
+def drain_outbox(batch_size=None, workers=None):
+    """Deliver batches until nothing is due. Returns total (sent, failed).
+
+    Up to `workers` (OUTBOX_CONCURRENCY) SMTP sessions run side by side,
+    each claiming its own batches; batches shrink so that the due entries
+    are spread over every session.
+    """
+    batch_size = batch_size or current_app.config['OUTBOX_BATCH_SIZE']
+    workers = workers or current_app.config['OUTBOX_CONCURRENCY']
+    if workers <= 1:
+        return _drain_batches(batch_size)
+    due = db.session.query(db.func.count(EmailOutbox.id)).filter(
+        EmailOutbox.next_attempt_at <= datetime.utcnow()).scalar()
+    db.session.commit()
+    if not due:
+        return 0, 0
+    workers = min(workers, due)
+    batch_size = max(1, min(batch_size, -(-due // workers)))
+    with ThreadPoolExecutor(workers, thread_name_prefix='smtp') as pool:
+        app = current_app._get_current_object()
+        results = list(pool.map(_drain_in_thread, [app] * workers, [batch_size] * workers))
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+_outbox_wakeup = threading.Event()
+_outbox_thread = None
+_outbox_lock = threading.Lock()
+
+
+def _outbox_loop(app):
+    while True:
+        _outbox_wakeup.wait(app.config['OUTBOX_POLL_SECONDS'])
+        _outbox_wakeup.clear()
+        try:
+            with app.app_context():
+                drain_outbox()
+        except Exception:
+            log.exception("outbox worker error")
+
+
+def wake_outbox_worker():
+    """Start the in-process outbox thread on first use and nudge it."""
+    global _outbox_thread
+    if current_app.config['OUTBOX_WORKER'] != 'thread':
+        return
+    with _outbox_lock:
+        if _outbox_thread is None or not _outbox_thread.is_alive():
+            _outbox_thread = threading.Thread(target=_outbox_loop, name='outbox', daemon=True,
+                                              args=(current_app._get_current_object(),))
+            _outbox_thread.start()
+    _outbox_wakeup.set()
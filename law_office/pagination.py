@@ -0,0 +1,80 @@
+"""Keyset (seek) pagination."""
+from flask import abort, current_app, request
+
+from .extensions import db
+
+# -----------------------
+# Pagination
+# -----------------------
+class KeysetPage:
+    """One page of rows plus the cursors for the pages around it."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def _decode_cursor(cursor, keys):
+    parts = cursor.split('~')
+    if len(parts) != len(keys):
+        raise ValueError(cursor)
+    return [convert(part) for part, (_, _, convert) in zip(parts, keys)]
+
+
+def _encode_cursor(values):
+    return '~'.join(repr(v) if isinstance(v, float) else str(v) for v in values)
+
+
+def _keyset_condition(keys, values, forward):
+    """Rows strictly after (forward) or before the cursor in display order."""
+    clauses = []
+    for i, (expr, descending, _) in enumerate(keys):
+        past = expr < values[i] if descending == forward else expr > values[i]
+        equal = [keys[j][0] == values[j] for j in range(i)]
+        clauses.append(db.and_(*equal, past))
+    return db.or_(*clauses)
+
+
+def keyset_paginate(query, keys, page_size, after=None, before=None):
+    """Fetch one page of `query` by seeking past a cursor instead of OFFSET.
+
+    `keys` is a list of (expression, descending, type) triples giving the
+    display order; the last one must be unique (normally the primary key).
+    `after`/`before` are cursors from a previous page's next/prev links;
+    one that does not decode for these keys is a 400, not the first page.
+    """
+    forward = before is None
+    cursor = after if forward else before
+    if cursor:
+        try:
+            query = query.filter(_keyset_condition(keys, _decode_cursor(cursor, keys), forward))
+        except ValueError:
+            abort(400, description=f'Invalid page cursor {cursor!r}')
+
+    order = []
+    for expr, descending, _ in keys:
+        order.append(expr.desc() if descending == forward else expr.asc())
+    rows = (
+        query.add_columns(*[expr for expr, _, _ in keys])
+        .order_by(*order)
+        .limit(page_size + 1)
+        .all()
+    )
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if not forward:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    first = _encode_cursor(rows[0][1:]) if rows else None
+    last = _encode_cursor(rows[-1][1:]) if rows else None
+    if forward:
+        return KeysetPage(items, last if more else None, first if cursor else None)
+    return KeysetPage(items, last if cursor else None, first if more else None)
+
+
+def page_size_arg():
+    """Page size from ?per_page=, clamped to CASES_MAX_PAGE_SIZE."""
+    size = request.args.get('per_page', type=int) or current_app.config['CASES_PAGE_SIZE']
+    return max(1, min(size, current_app.config['CASES_MAX_PAGE_SIZE']))
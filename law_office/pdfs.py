@@ -0,0 +1,165 @@
+"""Case file and cause list PDFs (ReportLab), rendered in web or pool processes.
+
+Nothing here touches Flask or the database: pool processes import just
+this module, and every document is built from plain dicts.
+"""
+import io
+from itertools import groupby
+from xml.sax.saxutils import escape as xml_escape
+
+PDF_CASE_FIELDS = [
+    ('Case No', 'case_number'), ('Client', 'client_name'), ('Client Email', 'client_email'),
+    ('Client Mobile', 'client_mobile'), ('Client Address', 'client_address'),
+    ('Opponent', 'opponent_name'), ('Lawyer', 'lawyer_name'), ('Court', 'court_name'),
+    ('Case Type', 'case_type'), ('Police Station', 'police_station'), ('Location', 'location'),
+    ('Filing Date', 'filing_date'), ('Status', 'status'), ('Total Fees', 'total_fees'),
+    ('Fees Paid', 'fees_paid'), ('Fees Pending', 'fees_pending'), ('Description', 'description'),
+]
+
+_pdf_kit = None  # per process: styles, fonts and page templates
+
+
+def init_pdf_worker(font_path=None):
+    """Register fonts and build styles and page templates for this process."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import Frame, PageTemplate, TableStyle
+    global _pdf_kit
+    font, bold = 'Helvetica', 'Helvetica-Bold'
+    if font_path:
+        # A TTF with wider coverage (e.g. Devanagari names); used for every style
+        pdfmetrics.registerFont(TTFont('CaseFont', font_path))
+        font = bold = 'CaseFont'
+    styles = {
+        'title': ParagraphStyle('title', fontName=bold, fontSize=15, leading=19, spaceAfter=4 * mm),
+        'heading': ParagraphStyle('heading', fontName=bold, fontSize=11, leading=14,
+                                  spaceBefore=4 * mm, spaceAfter=2 * mm),
+        'cell': ParagraphStyle('cell', fontName=font, fontSize=8.5, leading=10.5),
+    }
+    grid = [
+        ('GRID', (0, 0), (-1, -1), 0.4, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONT', (0, 0), (-1, -1), font, 8.5, 10.5),
+        ('LEFTPADDING', (0, 0), (-1, -1), 4),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+    ]
+    table_style = TableStyle(grid + [
+        ('FONT', (0, 0), (-1, 0), bold, 8.5, 10.5),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e9ecef')),
+    ])
+    fields_style = TableStyle(grid + [
+        ('FONT', (0, 0), (0, -1), bold, 8.5, 10.5),
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e9ecef')),
+    ])
+    width, height = A4
+    frame = Frame(15 * mm, 15 * mm, width - 30 * mm, height - 32 * mm, id='body')
+
+    def decorate(canvas, doc):
+        canvas.saveState()
+        canvas.setFont(font, 8)
+        canvas.drawString(15 * mm, height - 10 * mm, doc.office)
+        canvas.drawRightString(width - 15 * mm, height - 10 * mm, doc.title)
+        canvas.drawRightString(width - 15 * mm, 8 * mm, f'Page {doc.page}')
+        canvas.restoreState()
+
+    _pdf_kit = {
+        'styles': styles, 'table': table_style, 'fields': fields_style, 'font': font,
+        'templates': [PageTemplate(id='page', frames=[frame], onPage=decorate)],
+        'width': width - 30 * mm,
+    }
+
+
+def ensure_pdf_kit(font_path=None):
+    """The kit for rendering in this process, built on first use."""
+    if _pdf_kit is None:
+        init_pdf_worker(font_path)
+    return _pdf_kit
+
+
+def _pdf_text(value):
+    if value is None or value == '':
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    if hasattr(value, 'strftime'):
+        return value.strftime('%d-%m-%Y')
+    return str(value)
+
+
+def _build_pdf(title, office, story):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import BaseDocTemplate
+    buffer = io.BytesIO()
+    doc = BaseDocTemplate(buffer, pagesize=A4, title=title, author=office,
+                          pageTemplates=_pdf_kit['templates'])
+    doc.office = office
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _pdf_table(rows, widths, header=True):
+    """A grid; only cells too long for one line become (much slower) wrapping Paragraphs."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.platypus import Paragraph, Table
+    cell, font = _pdf_kit['styles']['cell'], _pdf_kit['font']
+    widths = [w * _pdf_kit['width'] for w in widths]
+    data = []
+    for row in rows:
+        cells = []
+        for value, width in zip(row, widths):
+            text = _pdf_text(value)
+            if '\n' in text or pdfmetrics.stringWidth(text, font, cell.fontSize) > width - 8:
+                text = Paragraph(xml_escape(text).replace('\n', '<br/>'), cell)
+            cells.append(text)
+        data.append(cells)
+    table = Table(data, colWidths=widths, repeatRows=1 if header else 0)
+    table.setStyle(_pdf_kit['table'] if header else _pdf_kit['fields'])
+    return table
+
+
+def render_case_pdf(case, hearings, office):
+    """A case file: the case's fields and its hearing history, newest first."""
+    from reportlab.platypus import Paragraph
+    styles = _pdf_kit['styles']
+    story = [
+        Paragraph(xml_escape(f"Case File: {_pdf_text(case['case_number'])}"), styles['title']),
+        _pdf_table([(label, case[key]) for label, key in PDF_CASE_FIELDS], [0.25, 0.75], header=False),
+        Paragraph(f'Hearing History ({len(hearings)})', styles['heading']),
+    ]
+    if hearings:
+        rows = [('Date', 'Stage', 'Notes', 'Next Hearing', 'Status')] + [
+            (h['hearing_date'], h['stage'], h['notes'], h['next_hearing_date'], h['updated_status'])
+            for h in hearings
+        ]
+        story.append(_pdf_table(rows, [0.14, 0.2, 0.38, 0.14, 0.14]))
+    else:
+        story.append(Paragraph('No hearings recorded', styles['cell']))
+    return _build_pdf(f"Case {case['case_number']}", office, story)
+
+
+def render_cause_list_pdf(day, entries, office, lawyer=None):
+    """One day's hearings grouped by court, in calendar_entries order."""
+    from reportlab.platypus import Paragraph
+    styles = _pdf_kit['styles']
+    title = f"Cause List: {day.strftime('%A')}, {day.strftime('%d-%m-%Y')}"
+    story = [Paragraph(xml_escape(title + (f' ({lawyer})' if lawyer else '')), styles['title'])]
+    for court, court_entries in groupby(entries, key=lambda e: e['court_name']):
+        rows = [('#', 'Case No', 'Client', 'Opponent', 'Lawyer', 'Stage')] + [
+            (n, e['case_number'], e['client_name'], e['opponent_name'], e['lawyer_name'],
+             e['stage'] or 'Next date')
+            for n, e in enumerate(court_entries, 1)
+        ]
+        story += [Paragraph(xml_escape(court or 'Court not recorded'), styles['heading']),
+                  _pdf_table(rows, [0.05, 0.17, 0.2, 0.2, 0.18, 0.2])]
+    if not entries:
+        story.append(Paragraph('No hearings on this day', styles['cell']))
+    return _build_pdf(title, office, story)
+
+
+def render_case_batch(batch, office):
+    """Pool task: [(file name, case, hearings)] -> [(file name, PDF bytes)]."""
+    return [(name, render_case_pdf(case, hearings, office)) for name, case, hearings in batch]
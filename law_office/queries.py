@@ -0,0 +1,136 @@
+"""SQL statement budgets and query-plan checks for the read pages."""
+import re
+from contextlib import contextmanager
+
+from flask import current_app
+
+from .cache import fragment_cache_disabled
+from .extensions import db
+from .models import Case, Hearing
+
+# -----------------------
+# Query accounting
+# -----------------------
+@contextmanager
+def count_queries(with_parameters=False):
+    """Collect every SQL statement run on the engine inside the block.
+
+        with count_queries() as statements:
+            client.get('/')
+        assert len(statements) <= 3
+
+    With with_parameters=True the list holds (statement, parameters) pairs.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            return statements.append(statement if not with_parameters else (statement, None))
+        statements.append((statement, parameters) if with_parameters else statement)
+
+    engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', record)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail with the offending SQL if the block runs more than `limit` statements."""
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        raise AssertionError(
+            f"{len(statements)} SQL statements (limit {limit}):\n" + "\n".join(statements)
+        )
+
+
+# Statements each read page may issue, independent of how much data it shows
+ROUTE_QUERY_BUDGETS = {
+    'cases.index': 4,  # case page, status counts, needs-attention counts, upcoming hearings
+    'cases.view_cases': 1,
+    'cases.case_details': 2,
+    'notifications.case_notifications': 2,
+    'hearings.edit_hearing': 1,
+}
+
+
+def check_route_queries():
+    """GET every budgeted route against the current data; return the results.
+
+    Returns a list of (path, statements, budget) tuples. Each path is
+    requested once to warm per-process caches, then counted.
+    """
+    case_id = db.session.query(db.func.max(Case.id)).scalar()
+    hearing_id = db.session.query(db.func.max(Hearing.id)).scalar()
+    paths = {'cases.index': '/', 'cases.view_cases': '/cases'}
+    if case_id:
+        paths['cases.case_details'] = f'/case/{case_id}'
+        paths['notifications.case_notifications'] = f'/case/{case_id}/notifications'
+    if hearing_id:
+        paths['hearings.edit_hearing'] = f'/hearing/{hearing_id}/edit'
+
+    client = current_app.test_client()
+    results = []
+    for endpoint, path in paths.items():
+        client.get(path)
+        with fragment_cache_disabled(), count_queries() as statements:
+            response = client.get(path)
+        if response.status_code != 200:
+            raise AssertionError(f"GET {path} returned {response.status_code}")
+        results.append((path, len(statements), ROUTE_QUERY_BUDGETS[endpoint]))
+    return results
+
+
+# Tables whose size does not grow with the case count; scanning them is fine
+SMALL_TABLES = {'settings', 'schema_version', 'case_status_count'}
+_SCAN_RE = re.compile(r'\bSCAN (\w+)')
+
+
+def check_query_plans(paths=None):
+    """Run EXPLAIN QUERY PLAN on every SELECT the given pages issue (SQLite).
+
+    A plan step that scans a whole table is reported unless the table is
+    tiny, it is an FTS virtual table, or the statement is an unfiltered walk
+    in ORDER BY order under a LIMIT (so it stops early). Returns a list of
+    (path, statement, plan lines) for the offending statements.
+    """
+    if paths is None:
+        paths = ['/', '/?status=Closed', '/?search=a', '/?status=Closed&search=a', '/cases',
+                 '/?after=2', '/?status=Closed&after=2', '/?attention=unscheduled', '/?attention=idle',
+                 '/calendar?view=month', '/calendar.ics']
+        case_id = db.session.query(db.func.max(Case.id)).scalar()
+        hearing_id = db.session.query(db.func.max(Hearing.id)).scalar()
+        if case_id:
+            paths += [f'/case/{case_id}', f'/case/{case_id}/notifications']
+        if hearing_id:
+            paths.append(f'/hearing/{hearing_id}/edit')
+
+    client = current_app.test_client()
+    problems = []
+    conn = db.session.connection()
+    tables = set(db.inspect(conn).get_table_names())
+    for path in paths:
+        client.get(path)
+        with fragment_cache_disabled(), count_queries(with_parameters=True) as statements:
+            client.get(path)
+        for statement, parameters in statements:
+            if parameters is None or not statement.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = [row[-1] for row in conn.exec_driver_sql(
+                'EXPLAIN QUERY PLAN ' + statement, tuple(parameters))]
+            sql = statement.upper()
+            bounded = ('LIMIT' in sql and ' WHERE ' not in sql
+                       and not any('TEMP B-TREE' in p for p in plan))
+            for line in plan:
+                match = _SCAN_RE.search(line)
+                if not match or match.group(1) not in tables or 'VIRTUAL TABLE' in line:
+                    continue
+                if match.group(1) in SMALL_TABLES or bounded:
+                    continue
+                problems.append((path, statement, plan))
+                break
+    db.session.rollback()
+    return problems
@@ -0,0 +1,363 @@
+"""Case search index and typeahead suggestions."""
+import bisect
+import heapq
+import operator
+import re
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .models import Case, CaseSearchTerm
+from .summaries import NEEDS_ATTENTION, needs_attention_condition
+
+# -----------------------
+# Case search
+# -----------------------
+CASE_SEARCH_FIELDS = (
+    'case_number', 'client_name', 'opponent_name', 'lawyer_name',
+    'court_name', 'police_station', 'description',
+)
+_TOKEN_RE = re.compile(r'\w+')
+_case_fts = db.table('case_fts', db.column('rowid'), db.column('rank'))
+
+
+def search_tokens(text):
+    """Split text into lowercase word tokens (same rules for indexing and queries)."""
+    return [t.lower() for t in _TOKEN_RE.findall(text or '')]
+
+
+def search_backend():
+    """Return 'fts5' or 'terms' depending on what the database provides."""
+    backend = current_app.extensions.get('case_search')
+    if backend is None:
+        backend = 'terms'
+        if current_app.config['SEARCH_BACKEND'] != 'terms' and db.engine.dialect.name == 'sqlite':
+            with db.engine.connect() as conn:
+                found = conn.execute(db.text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'case_fts'"
+                )).first()
+            if found:
+                backend = 'fts5'
+        current_app.extensions['case_search'] = backend
+    return backend
+
+
+def init_search_index():
+    """Create the search index for the configured backend and fill it if empty."""
+    configured = current_app.config['SEARCH_BACKEND']
+    backend = 'terms'
+    if configured != 'terms' and db.engine.dialect.name == 'sqlite':
+        columns = ', '.join(CASE_SEARCH_FIELDS)
+        try:
+            db.session.execute(db.text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS case_fts USING fts5("
+                f"{columns}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            ))
+            db.session.commit()
+            backend = 'fts5'
+        except db.exc.OperationalError:
+            db.session.rollback()
+            if configured == 'fts5':
+                raise
+    elif configured == 'fts5':
+        raise RuntimeError('SEARCH_BACKEND=fts5 requires SQLite')
+    current_app.extensions['case_search'] = backend
+
+    if backend == 'fts5':
+        empty = db.session.execute(db.text('SELECT 1 FROM case_fts LIMIT 1')).first() is None
+    else:
+        empty = db.session.query(CaseSearchTerm.id).first() is None
+    if empty and db.session.query(Case.id).first() is not None:
+        rebuild_search_index()
+
+
+def rebuild_search_index():
+    """Re-index every case from scratch. Returns the number of cases indexed."""
+    conn = db.session.connection()
+    if search_backend() == 'fts5':
+        columns = ', '.join(CASE_SEARCH_FIELDS)
+        conn.execute(db.text('DELETE FROM case_fts'))
+        conn.execute(db.text(
+            f'INSERT INTO case_fts(rowid, {columns}) SELECT id, {columns} FROM "case"'
+        ))
+    else:
+        conn.execute(db.delete(CaseSearchTerm))
+        rows = conn.execute(
+            db.select(Case.id, *[getattr(Case, f) for f in CASE_SEARCH_FIELDS])
+            .execution_options(yield_per=1000)
+        )
+        for chunk in rows.partitions():
+            _insert_search_terms(conn, chunk)
+    db.session.commit()
+    return db.session.query(Case.id).count()
+
+
+def _insert_search_terms(conn, rows):
+    postings = []
+    for row in rows:
+        terms = set()
+        for value in row[1:]:
+            terms.update(search_tokens(value))
+        postings.extend({'term': t[:120], 'case_id': row[0]} for t in terms)
+    if postings:
+        conn.execute(db.insert(CaseSearchTerm), postings)
+
+
+def reindex_cases(conn, case_ids):
+    """Refresh the search entries of the given cases on an open connection."""
+    case_ids = list(case_ids)
+    if not case_ids:
+        return
+    rows = conn.execute(
+        db.select(Case.id, *[getattr(Case, f) for f in CASE_SEARCH_FIELDS])
+        .where(Case.id.in_(case_ids))
+    ).all()
+    if search_backend() == 'fts5':
+        columns = ', '.join(CASE_SEARCH_FIELDS)
+        params = ', '.join(f':{f}' for f in CASE_SEARCH_FIELDS)
+        conn.execute(_case_fts.delete().where(_case_fts.c.rowid.in_(case_ids)))
+        if rows:
+            conn.execute(
+                db.text(f'INSERT INTO case_fts(rowid, {columns}) VALUES (:id, {params})'),
+                [row._asdict() for row in rows],
+            )
+    else:
+        conn.execute(db.delete(CaseSearchTerm).where(CaseSearchTerm.case_id.in_(case_ids)))
+        _insert_search_terms(conn, rows)
+
+
+@db.event.listens_for(Session, 'after_flush')
+def _sync_case_search(session, flush_context):
+    """Keep the search index in step with Case inserts, updates and deletes."""
+    changed = set()
+    for obj in session.new:
+        if isinstance(obj, Case):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Case):
+            attrs = db.inspect(obj).attrs
+            if any(attrs[f].history.has_changes() for f in CASE_SEARCH_FIELDS):
+                changed.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Case):
+            changed.add(obj.id)
+    if changed:
+        reindex_cases(session.connection(), changed)
+
+
+def filter_case_search(query, search_text):
+    """Restrict a Case query to cases matching every word of search_text.
+
+    Each word is matched as a prefix against the indexed fields. Returns the
+    filtered query and a rank column (lower is a better match), or
+    (query, None) when search_text holds no words.
+    """
+    tokens = search_tokens(search_text)
+    if not tokens:
+        return query, None
+
+    if search_backend() == 'fts5':
+        match = ' '.join('"%s"*' % t for t in tokens)
+        hits = (
+            db.select(_case_fts.c.rowid.label('case_id'), _case_fts.c.rank.label('rank'))
+            .where(db.literal_column('case_fts').op('MATCH')(match))
+            .subquery()
+        )
+        return query.join(hits, hits.c.case_id == Case.id), hits.c.rank
+
+    term = CaseSearchTerm.term
+    ranges = [db.and_(term >= t, term < t + '\U0010ffff') for t in tokens]
+    hits = (
+        db.select(CaseSearchTerm.case_id, (-db.func.count()).label('rank'))
+        .where(db.or_(*ranges))
+        .group_by(CaseSearchTerm.case_id)
+        .having(db.and_(*[db.func.max(db.case((r, 1), else_=0)) == 1 for r in ranges]))
+        .subquery()
+    )
+    return query.join(hits, hits.c.case_id == Case.id), hits.c.rank
+
+def apply_case_filters(query, search_text, status, attention=None):
+    """Apply the dashboard's search, status and needs-attention filters to a Case query or select.
+
+    Returns (query, rank) where rank is the search rank column or None.
+    """
+    rank = None
+    if search_text:
+        query, rank = filter_case_search(query, search_text)
+    if status and status != 'All':
+        query = query.filter(Case.status == status)
+    if attention in NEEDS_ATTENTION:
+        query = query.filter(needs_attention_condition(attention))
+    return query, rank
+
+# -----------------------
+# Typeahead
+# -----------------------
+# Per-process prefix indexes over the distinct values of a few free-text
+# Case fields, ranked by how many cases use each value. Built lazily with
+# one GROUP BY, patched on commit, and rebuilt every TYPEAHEAD_REFRESH_SECONDS
+# (or after bulk writes) so other processes' changes show up. They also feed
+# the calendar and bulk-notice pickers (case_type is indexed only for those).
+TYPEAHEAD_FIELDS = ('client_name', 'court_name', 'police_station', 'lawyer_name', 'case_type')
+TYPEAHEAD_MAX_RESULTS = 20
+TYPEAHEAD_SLICE_LIMIT = 4096
+_WORD_START_RE = re.compile(r'(?<=\s)\S')
+
+
+class PrefixIndex:
+    """Sorted (folded key, value) pairs; every word of a value is a key start.
+
+    Prefix ranges up to TYPEAHEAD_SLICE_LIMIT keys are ranked by their
+    positions in the frequency order; wider ones (short, common prefixes)
+    walk that order instead and stop at the first TYPEAHEAD_MAX_RESULTS
+    matches, which come early because so many values match.
+    """
+
+    def __init__(self, rows):
+        self.counts = {}
+        for value, n in rows:
+            value = (value or '').strip()
+            if value:
+                self.counts[value] = self.counts.get(value, 0) + n
+        self.starts = {value: self._starts(value) for value in self.counts}
+        self.keys = sorted((key, value) for value, starts in self.starts.items() for key in starts)
+        self.ranked = sorted(self._rank(value) for value in self.counts)
+        self.positions = None
+        self.memo = {}
+        self.built = time.monotonic()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _starts(value):
+        folded = value.casefold()
+        return [folded] + [folded[m.start():] for m in _WORD_START_RE.finditer(folded)]
+
+    def _rank(self, value):
+        return (-self.counts[value], value.casefold(), value)
+
+    def _search(self, prefix):
+        lo = bisect.bisect_left(self.keys, (prefix,))
+        hi = bisect.bisect_left(self.keys, (prefix + '\U0010ffff',), lo)
+        if hi - lo <= TYPEAHEAD_SLICE_LIMIT:
+            if self.positions is None:
+                self.positions = {value: i for i, (_, _, value) in enumerate(self.ranked)}
+            best = heapq.nsmallest(TYPEAHEAD_MAX_RESULTS, set(map(
+                self.positions.__getitem__, map(operator.itemgetter(1), self.keys[lo:hi]))))
+            return [self.ranked[i][2] for i in best]
+        top = []
+        for _, _, value in self.ranked:
+            if any(key.startswith(prefix) for key in self.starts[value]):
+                top.append(value)
+                if len(top) == TYPEAHEAD_MAX_RESULTS:
+                    break
+        return top
+
+    def lookup(self, prefix, limit=10):
+        """Up to `limit` values with a word starting with prefix, most used first."""
+        prefix = ' '.join(prefix.casefold().split())
+        with self.lock:
+            top = self.memo.get(prefix)
+            if top is None:
+                if len(self.memo) > 10000:
+                    self.memo.clear()
+                top = self.memo[prefix] = self._search(prefix)
+            return [(value, self.counts[value]) for value in top[:limit]]
+
+    def values(self):
+        """Every value in use, in case-insensitive order (for pickers)."""
+        with self.lock:
+            return sorted(self.counts, key=lambda value: (value.casefold(), value))
+
+    def adjust(self, value, delta):
+        value = (value or '').strip()
+        if not value or not delta:
+            return
+        with self.lock:
+            old = self.counts.get(value, 0)
+            self.positions = None
+            if old > 0:
+                del self.ranked[bisect.bisect_left(self.ranked, self._rank(value))]
+            if old + delta > 0:
+                self.counts[value] = old + delta
+                bisect.insort(self.ranked, self._rank(value))
+                if old <= 0:
+                    self.starts[value] = self._starts(value)
+                    for key in self.starts[value]:
+                        bisect.insort(self.keys, (key, value))
+            elif old > 0:
+                del self.counts[value]
+                for key in self.starts.pop(value):
+                    del self.keys[bisect.bisect_left(self.keys, (key, value))]
+            # Only cached prefixes of this value's words can have changed
+            for prefix in [p for p in self.memo if any(k.startswith(p) for k in self._starts(value))]:
+                del self.memo[prefix]
+
+
+def typeahead_index(field):
+    """The PrefixIndex for a TYPEAHEAD_FIELDS column, built on first use."""
+    indexes = current_app.extensions.setdefault('typeahead', {})
+    index = indexes.get(field)
+    if index is None or time.monotonic() - index.built > current_app.config['TYPEAHEAD_REFRESH_SECONDS']:
+        column = getattr(Case, field)
+        rows = db.session.execute(
+            db.select(column, db.func.count()).where(column.isnot(None)).group_by(column)
+        ).all()
+        index = indexes[field] = PrefixIndex(rows)
+    return index
+
+
+def _loaded_value(obj, field):
+    """The value a flushed-away row held for field, before any pending change."""
+    history = db.inspect(obj).attrs[field].history
+    return (history.deleted or history.unchanged or [None])[0]
+
+
+@db.event.listens_for(Session, 'after_flush')
+def _note_typeahead_changes(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Case):
+            changes += [(f, getattr(obj, f), 1) for f in TYPEAHEAD_FIELDS]
+    for obj in session.deleted:
+        if isinstance(obj, Case):
+            changes += [(f, _loaded_value(obj, f), -1) for f in TYPEAHEAD_FIELDS]
+    for obj in session.dirty:
+        if isinstance(obj, Case) and obj not in session.deleted:
+            for f in TYPEAHEAD_FIELDS:
+                history = db.inspect(obj).attrs[f].history
+                if history.added:
+                    old = history.deleted[0] if history.deleted else None
+                    changes += [(f, old, -1), (f, history.added[0], 1)]
+    if changes:
+        session.info.setdefault('typeahead_changes', []).extend(changes)
+
+
+@db.event.listens_for(Session, 'do_orm_execute')
+def _note_bulk_typeahead_changes(state):
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper \
+            and state.bind_mapper.class_ is Case:
+        state.session.info['typeahead_stale'] = True
+
+
+@db.event.listens_for(Session, 'after_commit')
+def _apply_typeahead_changes(session):
+    changes = session.info.pop('typeahead_changes', ())
+    indexes = current_app.extensions.get('typeahead')
+    if not indexes:
+        session.info.pop('typeahead_stale', None)
+        return
+    if session.info.pop('typeahead_stale', False):
+        indexes.clear()
+        return
+    for field, value, delta in changes:
+        if field in indexes:
+            indexes[field].adjust(value, delta)
+
+
+@db.event.listens_for(Session, 'after_rollback')
+def _forget_typeahead_changes(session):
+    session.info.pop('typeahead_changes', None)
+    session.info.pop('typeahead_stale', None)
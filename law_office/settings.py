@@ -0,0 +1,265 @@
+"""Lawyer settings, database maintenance commands and backups."""
+import multiprocessing
+import os
+import sqlite3
+import time
+import zlib
+from datetime import datetime
+
+import click
+from flask import (Blueprint, Response, current_app, flash, redirect, render_template, request,
+                   send_from_directory, url_for)
+
+from .backups import (BACKUP_CHUNK_BYTES, BACKUP_COMPRESSLEVEL, backup_name, create_backup,
+                      list_backups, remove_database_file, restore_database, sqlite_database_path,
+                      take_snapshot, verify_backup)
+from .extensions import db
+from .migrations import init_db, schema_version
+from .models import Case, Hearing, Settings
+from .outbox import send_test_email
+from .queries import check_query_plans, check_route_queries
+from .summaries import status_counts
+
+bp = Blueprint('settings', __name__, cli_group=None)
+
+
+# -----------------------
+# Lawyer Settings Routes
+# -----------------------
+@bp.route('/settings', methods=['GET', 'POST'])
+def settings():
+    s = Settings.query.first()
+    if not s:
+        s = Settings(lawyer_name='', lawyer_email='', email_password='', email_notifications_enabled=False)
+        db.session.add(s)
+        db.session.commit()
+
+    if request.method == 'POST':
+        data = request.form
+        s.lawyer_name = data.get('lawyer_name')
+        s.lawyer_email = data.get('lawyer_email')
+        s.email_password = data.get('email_password')
+        s.email_notifications_enabled = (data.get('email_notifications_enabled') == 'on')
+        db.session.commit()
+        flash('Settings updated successfully', 'success')
+        return redirect(url_for('settings.settings'))
+
+    return render_template('settings.html', settings=s)
+
+
+@bp.route('/settings/test-email', methods=['POST'])
+def test_email():
+    from smtplib import SMTPAuthenticationError
+    s = Settings.query.first()
+    if not s or not s.lawyer_email or not s.email_password:
+        flash('Please save valid email credentials before testing.', 'danger')
+        return redirect(url_for('settings.settings'))
+
+    try:
+        send_test_email(s.lawyer_email, s.email_password)
+        flash('Test email sent successfully (check your inbox).', 'success')
+    except SMTPAuthenticationError:
+        flash('Authentication failed. Check email or app password.', 'danger')
+    except Exception as e:
+        flash(f'Error sending test email: {e}', 'danger')
+    return redirect(url_for('settings.settings'))
+
+
+# -----------------------
+# Maintenance
+# -----------------------
+# small route to initialize DB quickly
+@bp.route('/init-db')
+def route_init_db():
+    init_db()
+    return "DB initialized"
+
+
+@bp.cli.command('check-queries')
+def check_queries_command():
+    """Fail if a read page issues more SQL statements than its budget."""
+    over = False
+    for path, count, budget in check_route_queries():
+        flag = 'OK' if count <= budget else 'OVER'
+        over = over or count > budget
+        click.echo(f"{flag:4} {path}: {count} statements (budget {budget})")
+    if over:
+        raise click.ClickException('Query budget exceeded (N+1?)')
+
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if a page query scans a whole table instead of using an index."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('EXPLAIN QUERY PLAN checks need SQLite')
+    problems = check_query_plans()
+    for path, statement, plan in problems:
+        click.echo(f"GET {path}\n  {' '.join(statement.split())}")
+        for line in plan:
+            click.echo(f"    {line}")
+    if problems:
+        raise click.ClickException(f'{len(problems)} statements scan a table')
+    click.echo('All page queries use an index')
+
+
+_stress_app = None  # set before the stress-writes pool forks
+
+
+def _stress_worker(args):
+    worker, writes = args
+    with _stress_app.app_context():
+        db.engine.dispose(close=False)  # never share the parent's pooled connections
+        ok, errors = 0, {}
+        for n in range(writes):
+            try:
+                case = Case(case_number=f'STRESS-{os.getpid()}-{worker}-{n}',
+                            client_name='Stress Test', status='Filed')
+                db.session.add(case)
+                db.session.flush()
+                db.session.add(Hearing(case_id=case.id, hearing_date=datetime.today().date(),
+                                       stage='stress'))
+                db.session.commit()
+                status_counts()  # a read between writes, like a dashboard hit
+                db.session.commit()
+                ok += 1
+            except db.exc.OperationalError as e:
+                db.session.rollback()
+                errors[str(e.orig)] = errors.get(str(e.orig), 0) + 1
+        return ok, errors
+
+
+@bp.cli.command('stress-writes')
+@click.option('--processes', default=4, show_default=True)
+@click.option('--writes', default=200, show_default=True, help='Commits per process.')
+@click.option('--keep', is_flag=True, help='Leave the STRESS-* cases in the database.')
+def stress_writes_command(processes, writes, keep):
+    """Hammer the database with concurrent writers from several processes."""
+    global _stress_app
+    _stress_app = current_app._get_current_object()
+    init_db()
+    db.engine.dispose()
+    start = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        results = pool.map(_stress_worker, [(i, writes) for i in range(processes)])
+    elapsed = time.perf_counter() - start
+
+    ok = sum(r[0] for r in results)
+    errors = {}
+    for _, errs in results:
+        for message, count in errs.items():
+            errors[message] = errors.get(message, 0) + count
+    click.echo(f"{ok} commits from {processes} processes in {elapsed:.2f}s "
+               f"({ok / elapsed:.0f}/s)")
+    for message, count in errors.items():
+        click.echo(f"  {count} x {message}")
+
+    if not keep:
+        ids = [row.id for row in db.session.query(Case.id).filter(Case.case_number.like('STRESS-%'))]
+        for i in range(0, len(ids), 500):
+            for case in Case.query.filter(Case.id.in_(ids[i:i + 500])):
+                db.session.delete(case)
+            db.session.commit()
+    if errors:
+        raise click.ClickException(f"{sum(errors.values())} writes failed")
+
+
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending schema migrations."""
+    init_db()
+    click.echo(f"Schema version {schema_version()}")
+
+# -----------------------
+# Backups
+# -----------------------
+@bp.cli.command('db-backup')
+@click.option('--keep', type=int, default=None, help='Snapshots to keep (default BACKUP_KEEP).')
+def db_backup_command(keep):
+    """Snapshot the live database into BACKUP_DIR without stopping the app."""
+    start = time.perf_counter()
+    try:
+        path, pages = create_backup(keep)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{path}: {pages} pages, {os.path.getsize(path) / 1048576:.1f} MiB "
+               f"in {time.perf_counter() - start:.1f}s")
+
+
+@bp.cli.command('db-verify')
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+def db_verify_command(paths):
+    """Integrity-check snapshots (default: every one in BACKUP_DIR)."""
+    paths = paths or [os.path.join(current_app.config['BACKUP_DIR'], name) for name, _, _ in list_backups()]
+    bad = 0
+    for path in paths:
+        problems = verify_backup(path)
+        click.echo(f"{path}: {'ok' if not problems else '; '.join(problems[:5])}")
+        bad += bool(problems)
+    if bad:
+        raise click.ClickException(f'{bad} of {len(paths)} snapshots failed verification')
+
+
+@bp.cli.command('db-restore')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.confirmation_option(prompt='Replace the live database with this snapshot?')
+def db_restore_command(path):
+    """Restore a .db.gz (or .db) snapshot over the live database.
+
+    The generation bump reaches every running worker, so no cached page or
+    ETag outlives the restore; typeahead suggestions in other workers catch
+    up within TYPEAHEAD_REFRESH_SECONDS.
+    """
+    try:
+        safety = restore_database(path)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Restored {path}; the previous contents are in {safety}")
+
+
+@bp.route('/admin/backups', methods=['GET', 'POST'])
+def backups():
+    if request.method == 'POST':
+        try:
+            path, pages = create_backup()
+            flash(f'Snapshot {os.path.basename(path)} created ({pages} pages)', 'success')
+        except (ValueError, sqlite3.Error, OSError) as e:
+            flash(f'Backup failed: {e}', 'danger')
+        return redirect(url_for('settings.backups'))
+    try:
+        sqlite_database_path()
+        supported = True
+    except ValueError:
+        supported = False
+    return render_template('backups.html', backups=list_backups(), supported=supported,
+                           keep=current_app.config['BACKUP_KEEP'])
+
+
+@bp.route('/admin/backups/<name>')
+def download_backup(name):
+    return send_from_directory(current_app.config['BACKUP_DIR'], name, as_attachment=True)
+
+
+@bp.route('/admin/backup.db.gz')
+def download_snapshot():
+    """Take a fresh snapshot and stream it out, gzip-compressed as it is read."""
+    try:
+        path, _ = take_snapshot()
+    except (ValueError, sqlite3.Error, OSError) as e:
+        flash(f'Backup failed: {e}', 'danger')
+        return redirect(url_for('settings.backups'))
+
+    def generate():
+        compressor = zlib.compressobj(BACKUP_COMPRESSLEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+        try:
+            with open(path, 'rb') as snapshot:
+                while chunk := snapshot.read(BACKUP_CHUNK_BYTES):
+                    data = compressor.compress(chunk)
+                    if data:
+                        yield data
+            yield compressor.flush()
+        finally:
+            remove_database_file(path)
+
+    return Response(generate(), mimetype='application/gzip', headers={
+        'Content-Disposition': f'attachment; filename="{backup_name()}"',
+    })
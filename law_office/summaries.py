@@ -0,0 +1,321 @@
+"""Counters and summary columns kept current on every flush."""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .models import Case, CaseStatusCount, FeeSummary, Hearing
+
+# -----------------------
+# Dashboard counters
+# -----------------------
+def adjust_status_counts(conn, deltas):
+    """Apply {status: delta} changes to the per-status counter table."""
+    table = CaseStatusCount.__table__
+    for status, delta in deltas.items():
+        if not delta:
+            continue
+        status = status or ''
+        updated = conn.execute(
+            table.update()
+            .where(table.c.status == status)
+            .values(count=table.c.count + delta)
+        )
+        if updated.rowcount == 0:
+            conn.execute(table.insert().values(status=status, count=delta))
+
+
+@db.event.listens_for(Session, 'before_flush')
+def _track_status_counts(session, flush_context, instances):
+    """Move case counters between statuses in the same transaction as the write."""
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Case):
+            deltas[obj.status] = deltas.get(obj.status, 0) + 1
+    for obj in session.deleted:
+        if isinstance(obj, Case):
+            old = db.inspect(obj).attrs.status.history
+            status = old.deleted[0] if old.deleted else obj.status
+            deltas[status] = deltas.get(status, 0) - 1
+    for obj in session.dirty:
+        if isinstance(obj, Case) and obj not in session.deleted:
+            history = db.inspect(obj).attrs.status.history
+            if history.added and history.deleted and history.added[0] != history.deleted[0]:
+                deltas[history.deleted[0]] = deltas.get(history.deleted[0], 0) - 1
+                deltas[history.added[0]] = deltas.get(history.added[0], 0) + 1
+    deltas = {(k or ''): v for k, v in deltas.items()}
+    if any(deltas.values()):
+        adjust_status_counts(session.connection(), deltas)
+
+
+def status_counts():
+    """Return {status: count} from the counter table (no scan of case)."""
+    return {
+        row.status: row.count
+        for row in CaseStatusCount.query.filter(CaseStatusCount.count != 0)
+    }
+
+
+def actual_status_counts():
+    rows = db.session.query(Case.status, db.func.count()).group_by(Case.status)
+    return {(status or ''): n for status, n in rows}
+
+
+def rebuild_status_counts():
+    """Recompute the counter table with one GROUP BY over case."""
+    actual = actual_status_counts()
+    db.session.query(CaseStatusCount).delete()
+    db.session.add_all(CaseStatusCount(status=k, count=v) for k, v in actual.items())
+    db.session.commit()
+    return actual
+
+
+def init_status_counts():
+    if CaseStatusCount.query.first() is None and db.session.query(Case.id).first() is not None:
+        rebuild_status_counts()
+
+# -----------------------
+# Hearing summary
+# -----------------------
+# Case.latest_listed_date is the latest date the case is listed for (a
+# hearing date or a next date, past or future; not the next upcoming one),
+# last_hearing_date the latest hearing date, hearing_count the number of
+# hearings. Flushes that touch hearings recompute them for the affected
+# cases, so "needs attention" filters are range scans over one table
+# instead of subqueries over every hearing.
+HEARING_SUMMARY_FIELDS = ('latest_listed_date', 'last_hearing_date', 'hearing_count')
+
+
+def _later_date(hearing_date, next_hearing_date):
+    """The later of two dates, ignoring either one when it is NULL (a portable GREATEST)."""
+    return db.case(
+        (next_hearing_date.is_(None), hearing_date), (hearing_date.is_(None), next_hearing_date),
+        (hearing_date > next_hearing_date, hearing_date), else_=next_hearing_date,
+    )
+
+
+def refresh_hearing_summary(conn, case_ids=None):
+    """Recompute the hearing columns of the given cases (every case when None)."""
+    table = Case.__table__
+    of_case = Hearing.case_id == table.c.id
+    stmt = table.update().values(
+        latest_listed_date=db.select(_later_date(
+            db.func.max(Hearing.hearing_date), db.func.max(Hearing.next_hearing_date),
+        )).where(of_case).scalar_subquery(),
+        last_hearing_date=db.select(db.func.max(Hearing.hearing_date)).where(of_case).scalar_subquery(),
+        hearing_count=db.select(db.func.count()).select_from(Hearing).where(of_case).scalar_subquery(),
+    )
+    if case_ids is None:
+        return conn.execute(stmt).rowcount
+    case_ids = sorted(case_ids)
+    updated = 0
+    for i in range(0, len(case_ids), 500):
+        updated += conn.execute(stmt.where(table.c.id.in_(case_ids[i:i + 500]))).rowcount
+    return updated
+
+
+def rebuild_hearing_summary():
+    """Recompute the hearing columns of every case."""
+    updated = refresh_hearing_summary(db.session.connection())
+    db.session.commit()
+    return updated
+
+
+def stale_hearing_summaries():
+    """Ids of cases whose hearing columns disagree with their hearings."""
+    summary = db.select(
+        Hearing.case_id,
+        db.func.max(Hearing.hearing_date).label('last'),
+        db.func.max(Hearing.next_hearing_date).label('last_next'),
+        db.func.count().label('n'),
+    ).group_by(Hearing.case_id).subquery()
+    latest = _later_date(summary.c.last, summary.c.last_next)
+    return db.session.execute(
+        db.select(Case.id).outerjoin(summary, summary.c.case_id == Case.id).where(db.or_(
+            Case.hearing_count != db.func.coalesce(summary.c.n, 0),
+            Case.last_hearing_date.is_distinct_from(summary.c.last),
+            Case.latest_listed_date.is_distinct_from(latest),
+        )).order_by(Case.id)
+    ).scalars().all()
+
+
+NEEDS_ATTENTION = {
+    'unscheduled': 'No date listed ahead',
+    'idle': 'No hearing in {days} days',
+}
+
+
+def needs_attention_condition(kind, today=None):
+    """Filter for open cases with nothing listed ahead ('unscheduled') or
+    no hearing for NEEDS_ATTENTION_IDLE_DAYS ('idle'; filing date when no hearings)."""
+    today = today or datetime.today().date()
+    if kind == 'unscheduled':
+        condition = db.or_(Case.latest_listed_date.is_(None), Case.latest_listed_date < today)
+    else:
+        cutoff = today - timedelta(days=current_app.config['NEEDS_ATTENTION_IDLE_DAYS'])
+        condition = db.or_(
+            Case.last_hearing_date < cutoff,
+            db.and_(Case.last_hearing_date.is_(None), Case.filing_date < cutoff),
+        )
+    return db.and_(condition, Case.status.is_distinct_from('Closed'))
+
+
+def needs_attention_labels():
+    days = current_app.config['NEEDS_ATTENTION_IDLE_DAYS']
+    return {kind: label.format(days=days) for kind, label in NEEDS_ATTENTION.items()}
+
+
+def needs_attention_counts(today=None):
+    """{kind: number of matching cases} for the dashboard panel.
+
+    One statement: each count is a scalar subquery, so each keeps its own index.
+    """
+    kinds = sorted(NEEDS_ATTENTION)
+    row = db.session.execute(db.select(*[
+        db.select(db.func.count(Case.id)).where(needs_attention_condition(kind, today))
+        .scalar_subquery().label(kind)
+        for kind in kinds
+    ])).one()
+    return dict(zip(kinds, row))
+
+
+@db.event.listens_for(Session, 'after_flush')
+def _note_hearing_cases(session, flush_context):
+    """Remember which cases had hearings added, removed or re-dated."""
+    case_ids = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Hearing):
+            case_ids.update(db.inspect(obj).attrs.case_id.history.sum())
+    for obj in session.dirty:
+        if isinstance(obj, Hearing) and obj not in session.deleted:
+            attrs = db.inspect(obj).attrs
+            if any(attrs[f].history.has_changes() for f in ('case_id', 'hearing_date', 'next_hearing_date')):
+                case_ids.update(attrs.case_id.history.sum())
+    case_ids.discard(None)
+    if case_ids:
+        session.info.setdefault('hearing_cases', set()).update(case_ids)
+
+
+@db.event.listens_for(Session, 'after_flush_postexec')
+def _refresh_hearing_cases(session, flush_context):
+    case_ids = session.info.pop('hearing_cases', None)
+    if not case_ids:
+        return
+    refresh_hearing_summary(session.connection(), case_ids)
+    for case_id in case_ids:
+        case = session.identity_map.get(session.identity_key(Case, case_id))
+        if case is not None:
+            session.expire(case, HEARING_SUMMARY_FIELDS)
+
+
+@db.event.listens_for(Session, 'after_rollback')
+def _forget_hearing_cases(session):
+    session.info.pop('hearing_cases', None)
+
+# -----------------------
+# Fee summary
+# -----------------------
+# Fee and workload rollups read from fee_summary, which holds one row per
+# (lawyer, court, case type, filing month, status). Flushes and imports
+# move case counts and fees between rows, like the status counters.
+FEE_SUMMARY_KEYS = ('lawyer_name', 'court_name', 'case_type', 'filing_month', 'status')
+FEE_SUMMARY_VALUES = ('cases', 'total_fees', 'fees_paid', 'fees_pending')
+
+
+def fee_summary_key(values):
+    """The fee_summary row a case with these column values belongs to."""
+    filed = values.get('filing_date')
+    return (
+        values.get('lawyer_name') or '', values.get('court_name') or '',
+        values.get('case_type') or '', filed.strftime('%Y-%m') if filed else '',
+        values.get('status') or '',
+    )
+
+
+def _add_fee_delta(deltas, key, sign, values):
+    row = deltas.setdefault(key, [0, 0.0, 0.0, 0.0])
+    row[0] += sign
+    row[1] += sign * (values.get('total_fees') or 0.0)
+    row[2] += sign * (values.get('fees_paid') or 0.0)
+    row[3] += sign * (values.get('fees_pending') or 0.0)
+
+
+def adjust_fee_summary(conn, deltas):
+    """Apply {summary key: [cases, total, paid, pending]} changes to fee_summary."""
+    table = FeeSummary.__table__
+    for key, change in deltas.items():
+        if not any(change):
+            continue
+        match = db.and_(*[table.c[k] == v for k, v in zip(FEE_SUMMARY_KEYS, key)])
+        updated = conn.execute(
+            table.update().where(match).values(
+                {name: table.c[name] + d for name, d in zip(FEE_SUMMARY_VALUES, change)})
+        )
+        if updated.rowcount == 0:
+            conn.execute(table.insert().values(
+                dict(zip(FEE_SUMMARY_KEYS, key)) | dict(zip(FEE_SUMMARY_VALUES, change))))
+
+
+def _case_values(case, old=False):
+    """Column values of a Case as loaded (old=True) or as about to be written."""
+    state = db.inspect(case)
+    values = {}
+    for name in ('lawyer_name', 'court_name', 'case_type', 'filing_date', 'status',
+                 'total_fees', 'fees_paid', 'fees_pending'):
+        history = state.attrs[name].history
+        if old and history.deleted:
+            values[name] = history.deleted[0]
+        else:
+            values[name] = getattr(case, name)
+    return values
+
+
+@db.event.listens_for(Session, 'before_flush')
+def _track_fee_summary(session, flush_context, instances):
+    """Move case fees between summary rows in the same transaction as the write."""
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Case):
+            values = _case_values(obj)
+            _add_fee_delta(deltas, fee_summary_key(values), 1, values)
+    for obj in session.deleted:
+        if isinstance(obj, Case):
+            values = _case_values(obj, old=True)
+            _add_fee_delta(deltas, fee_summary_key(values), -1, values)
+    for obj in session.dirty:
+        if isinstance(obj, Case) and obj not in session.deleted:
+            old, new = _case_values(obj, old=True), _case_values(obj)
+            if old != new:
+                _add_fee_delta(deltas, fee_summary_key(old), -1, old)
+                _add_fee_delta(deltas, fee_summary_key(new), 1, new)
+    if deltas:
+        adjust_fee_summary(session.connection(), deltas)
+
+
+def _filing_month_sql():
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.coalesce(db.func.strftime('%Y-%m', Case.filing_date), '')
+    return db.func.coalesce(db.func.to_char(Case.filing_date, 'YYYY-MM'), '')
+
+
+def rebuild_fee_summary():
+    """Recompute fee_summary with one GROUP BY over case."""
+    keys = [db.func.coalesce(Case.lawyer_name, ''), db.func.coalesce(Case.court_name, ''),
+            db.func.coalesce(Case.case_type, ''), _filing_month_sql(),
+            db.func.coalesce(Case.status, '')]
+    select = db.select(
+        *keys, db.func.count(),
+        db.func.coalesce(db.func.sum(Case.total_fees), 0.0),
+        db.func.coalesce(db.func.sum(Case.fees_paid), 0.0),
+        db.func.coalesce(db.func.sum(Case.fees_pending), 0.0),
+    ).group_by(*keys)
+    db.session.execute(db.delete(FeeSummary))
+    db.session.execute(
+        db.insert(FeeSummary).from_select(FEE_SUMMARY_KEYS + FEE_SUMMARY_VALUES, select))
+    db.session.commit()
+
+
+def init_fee_summary():
+    if FeeSummary.query.first() is None and db.session.query(Case.id).first() is not None:
+        rebuild_fee_summary()
@@ -0,0 +1,60 @@
+"""Fixtures: the app on a fresh, migrated SQLite database per test."""
+from datetime import date, timedelta
+
+import pytest
+
+from law_office import create_app
+from law_office.extensions import db
+from law_office.migrations import init_db
+from law_office.models import CASE_STATUSES, Case, Hearing, Notification
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app whose database, caches and backups all live in tmp_path."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'law_office.db'}")
+    monkeypatch.setenv('CACHE_PATH', str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setenv('BACKUP_DIR', str(tmp_path / 'backups'))
+    monkeypatch.setenv('JINJA_CACHE_DIR', '')
+    monkeypatch.setenv('OUTBOX_WORKER', 'off')
+    monkeypatch.setenv('LOG_LEVEL', 'WARNING')
+    monkeypatch.delenv('METRICS_DIR', raising=False)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        init_db()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def seeded(app):
+    """Twelve cases across every status, each with three hearings and two notifications.
+
+    Enough rows that a per-row query in a listing blows its budget.
+    """
+    today = date.today()
+    with app.app_context():
+        for n in range(12):
+            case = Case(
+                case_number=f'CS/{n}/2024', client_name=f'Client {n}',
+                client_email=f'client{n}@example.com', lawyer_name=f'Adv. Lawyer {n % 3}',
+                court_name=f'District Court {n % 4}', case_type=('Civil', 'Criminal')[n % 2],
+                status=CASE_STATUSES[n % len(CASE_STATUSES)], filing_date=today - timedelta(days=30 * n),
+                total_fees=10000.0, fees_paid=1000.0 * n, notify_client=True,
+            )
+            case.recalc_fees()
+            case.hearings = [
+                Hearing(hearing_date=today + timedelta(days=days), stage='Evidence',
+                        next_hearing_date=today + timedelta(days=days + 14))
+                for days in (-60, -7, 10 + n)
+            ]
+            db.session.add(case)
+            db.session.add_all(
+                Notification(case=case, email_to=case.client_email, subject=f'Update {k}',
+                             body=f'Dear client,\n\nUpdate {k} on your case.')
+                for k in range(2)
+            )
+        db.session.commit()
+    return app
@@ -0,0 +1,17 @@
+"""Concurrent writers from several processes under the default SQLite pragmas."""
+from law_office.extensions import db
+from law_office.models import Case
+from law_office.summaries import status_counts
+
+
+def test_concurrent_writers_never_hit_database_is_locked(app):
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+    result = app.test_cli_runner().invoke(
+        args=['stress-writes', '--processes', '3', '--writes', '20'])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('60 commits from 3 processes')
+    assert 'database is locked' not in result.output
+    with app.app_context():  # the STRESS-* cases are cleaned up and the counters agree
+        assert Case.query.count() == 0
+        assert sum(status_counts().values()) == 0
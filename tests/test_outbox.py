@@ -0,0 +1,57 @@
+"""Outbox delivery honours the notification switches at send time."""
+import pytest
+
+from law_office import outbox
+from law_office.extensions import db
+from law_office.models import Case, EmailOutbox, Notification, Settings
+
+
+class FakeSMTP:
+    def __init__(self):
+        self.sent = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def send_message(self, msg):
+        self.sent.append(msg['To'])
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    server = FakeSMTP()
+    monkeypatch.setattr(outbox, 'smtp_connect', lambda user, password: server)
+    return server
+
+
+def queue_for(case_ids):
+    settings = Settings.query.first()
+    settings.email_notifications_enabled = True
+    db.session.commit()
+    return [outbox.send_client_email(db.session.get(Case, case_id), 'Update', 'Body').id
+            for case_id in case_ids]
+
+
+def test_turning_email_off_cancels_queued_entries(seeded, smtp):
+    with seeded.app_context():
+        note_ids = queue_for([1, 2])
+        Settings.query.first().email_notifications_enabled = False
+        db.session.commit()
+        assert outbox.deliver_outbox() == (0, 0)
+        assert smtp.sent == []
+        assert {db.session.get(Notification, i).status for i in note_ids} == {'cancelled'}
+        assert EmailOutbox.query.count() == 0
+
+
+def test_turning_a_case_off_cancels_only_its_entries(seeded, smtp):
+    with seeded.app_context():
+        note_ids = queue_for([1, 2])
+        db.session.get(Case, 1).notify_client = False
+        db.session.commit()
+        assert outbox.deliver_outbox() == (1, 0)
+        assert smtp.sent == [db.session.get(Case, 2).client_email]
+        statuses = [db.session.get(Notification, i).status for i in note_ids]
+        assert statuses == ['cancelled', 'sent']
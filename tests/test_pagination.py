@@ -0,0 +1,16 @@
+"""Keyset pagination cursors."""
+import pytest
+
+
+@pytest.mark.parametrize('path', ['/?before=garbage', '/?after=1~2', '/cases?after=x',
+                                  '/case/1/notifications?before=nope'])
+def test_undecodable_cursor_is_a_bad_request(seeded, path):
+    assert seeded.test_client().get(path).status_code == 400
+
+
+def test_next_link_cursor_is_accepted(seeded):
+    seeded.config['CASES_PAGE_SIZE'] = 5
+    client = seeded.test_client()
+    first = client.get('/cases')
+    assert b'after=' in first.data
+    assert client.get('/cases?after=8').status_code == 200
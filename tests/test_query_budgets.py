@@ -0,0 +1,36 @@
+"""Each read page stays within its ROUTE_QUERY_BUDGETS statement count."""
+import pytest
+
+from law_office.cache import fragment_cache_disabled
+from law_office.extensions import db
+from law_office.models import Case, Hearing
+from law_office.queries import ROUTE_QUERY_BUDGETS, assert_max_queries
+
+
+def budget_paths():
+    """The path to request for every budgeted endpoint, using the newest rows."""
+    case_id = db.session.query(db.func.max(Case.id)).scalar()
+    hearing_id = db.session.query(db.func.max(Hearing.id)).scalar()
+    return {
+        'cases.index': '/',
+        'cases.view_cases': '/cases',
+        'cases.case_details': f'/case/{case_id}',
+        'notifications.case_notifications': f'/case/{case_id}/notifications',
+        'hearings.edit_hearing': f'/hearing/{hearing_id}/edit',
+    }
+
+
+def test_every_budget_names_a_route(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    assert set(ROUTE_QUERY_BUDGETS) <= endpoints
+
+
+@pytest.mark.parametrize('endpoint', sorted(ROUTE_QUERY_BUDGETS))
+def test_route_stays_within_budget(seeded, endpoint):
+    client = seeded.test_client()
+    with seeded.app_context():
+        path = budget_paths()[endpoint]
+        client.get(path)  # warm per-process caches (settings, typeahead, search backend)
+        with fragment_cache_disabled(), assert_max_queries(ROUTE_QUERY_BUDGETS[endpoint]):
+            response = client.get(path)
+    assert response.status_code == 200
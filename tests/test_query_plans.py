@@ -0,0 +1,22 @@
+"""EXPLAIN QUERY PLAN: the read pages use indexes on a migrated database."""
+from law_office.extensions import db
+from law_office.queries import check_query_plans
+
+
+def describe(problems):
+    return '\n'.join(f"GET {path}: {' '.join(statement.split())}\n  " + '\n  '.join(plan)
+                     for path, statement, plan in problems)
+
+
+def test_page_queries_use_an_index(seeded):
+    with seeded.app_context():
+        problems = check_query_plans()
+    assert not problems, describe(problems)
+
+
+def test_a_dropped_index_is_reported(seeded):
+    with seeded.app_context():
+        db.session.execute(db.text('DROP INDEX ix_hearing_hearing_date'))
+        db.session.commit()
+        problems = check_query_plans(['/calendar?view=month'])
+    assert any('hearing' in statement for _, statement, _ in problems)